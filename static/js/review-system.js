@@ -33,6 +33,9 @@ class ReviewSystem {
                 this.setupCancelButton();
             }
             
+            // Load further pages of reviews on demand
+            this.initLoadMoreButton();
+            
             // Apply role-based permissions to review elements
             this.applyRoleBasedPermissions();
             
@@ -584,6 +587,58 @@ class ReviewSystem {
     }
     
     addReviewToList(review) {
+        const reviewElement = this.createReviewElement(review);
+        
+        // Add to the top of the reviews list
+        this.reviewsList.insertBefore(reviewElement, this.reviewsList.firstChild);
+        
+        // Update average rating if displayed
+        if (review.product_rating) {
+            const productRating = document.querySelector('.product-rating');
+            if (productRating) {
+                this.updateProductRating(productRating, review.product_rating);
+            }
+        }
+    }
+    
+    initLoadMoreButton() {
+        // Only the first page of reviews is rendered, the rest comes from the reviews API
+        const loadMoreBtn = document.getElementById('load-more-reviews');
+        if (!loadMoreBtn || !this.reviewsList) {
+            return;
+        }
+        
+        loadMoreBtn.addEventListener('click', () => {
+            loadMoreBtn.disabled = true;
+            const params = new URLSearchParams({ cursor: loadMoreBtn.dataset.cursor });
+            
+            fetch(`/api/products/${loadMoreBtn.dataset.productId}/reviews/?${params}`)
+                .then(response => {
+                    if (!response.ok) {
+                        throw new Error(`HTTP error! Status: ${response.status}`);
+                    }
+                    return response.json();
+                })
+                .then(data => {
+                    data.reviews.forEach(review => {
+                        this.reviewsList.appendChild(this.createReviewElement(review));
+                    });
+                    
+                    if (data.next_cursor) {
+                        loadMoreBtn.dataset.cursor = data.next_cursor;
+                        loadMoreBtn.disabled = false;
+                    } else {
+                        loadMoreBtn.remove();
+                    }
+                })
+                .catch(error => {
+                    console.error('Error loading reviews:', error);
+                    loadMoreBtn.disabled = false;
+                });
+        });
+    }
+    
+    createReviewElement(review) {
         // Create new review element
         const reviewElement = document.createElement('div');
         reviewElement.className = 'review';
@@ -637,16 +692,7 @@ class ReviewSystem {
             </div>
         `;
         
-        // Add to the top of the reviews list
-        this.reviewsList.insertBefore(reviewElement, this.reviewsList.firstChild);
-        
-        // Update average rating if displayed
-        if (review.product_rating) {
-            const productRating = document.querySelector('.product-rating');
-            if (productRating) {
-                this.updateProductRating(productRating, review.product_rating);
-            }
-        }
+        return reviewElement;
     }
     
     updateProductRating(productRatingElement, newRating) {
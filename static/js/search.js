@@ -98,10 +98,32 @@ document.addEventListener('DOMContentLoaded', function() {
         saveRecentSearch(currentQuery);
     }
     
+    // Autocomplete suggestions under the search box
+    function fetchCompletions(query, completionsList) {
+        fetch(`/api/search/autocomplete/?q=${encodeURIComponent(query)}`)
+            .then(response => response.json())
+            .then(data => {
+                completionsList.innerHTML = '';
+                (data.completions || []).forEach(completion => {
+                    const option = document.createElement('option');
+                    option.value = completion.text;
+                    completionsList.appendChild(option);
+                });
+            })
+            .catch(error => {
+                console.error('Error fetching completions:', error);
+            });
+    }
+    
     // Live search functionality
     if (searchInput) {
         let searchTimeout;
         
+        const completionsList = document.createElement('datalist');
+        completionsList.id = 'search-completions';
+        document.body.appendChild(completionsList);
+        searchInput.setAttribute('list', completionsList.id);
+        
         searchInput.addEventListener('input', function() {
             clearTimeout(searchTimeout);
             const query = this.value.trim();
@@ -109,7 +131,12 @@ document.addEventListener('DOMContentLoaded', function() {
             // Only perform search if query is at least 2 characters
             if (query.length >= 2) {
                 searchTimeout = setTimeout(() => {
-                    performLiveSearch(query);
+                    fetchCompletions(query, completionsList);
+                    
+                    // Full results only where there's a live results container to fill
+                    if (resultsContainer) {
+                        performLiveSearch(query);
+                    }
                 }, 300);
             } else if (resultsContainer) {
                 // Clear results if query is too short
@@ -215,7 +242,7 @@ document.addEventListener('DOMContentLoaded', function() {
         }
         
         // Fetch search results
-        fetch(`/api/search?${queryString}`)
+        fetch(`/api/search/?${queryString}`)
             .then(response => response.json())
             .then(data => {
                 if (resultsContainer) {
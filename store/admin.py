@@ -9,6 +9,8 @@ from django.contrib import messages
 from django.contrib.admin.helpers import ActionForm
 from django.forms import CharField, HiddenInput
 from .models import Product, Category, User, Review
+from .outbound import get_httpx_client
+from .keywords import sync_product_keywords
 import os
 import openai
 import json
@@ -91,6 +93,12 @@ class ProductAdmin(admin.ModelAdmin):
     
     get_keywords_display.short_description = 'Keywords'
     
+    def save_model(self, request, obj, form, change):
+        """Keep the normalized keyword links in sync with the keywords text"""
+        super().save_model(request, obj, form, change)
+        if not change or 'keywords' in form.changed_data:
+            sync_product_keywords(obj)
+    
     def get_readonly_fields(self, request, obj=None):
         """Make keywords field read-only for non-admin users"""
         if not request.user.is_superuser:
@@ -119,7 +127,8 @@ class ProductAdmin(admin.ModelAdmin):
             
         # Initialize OpenAI client
         try:
-            client = openai.OpenAI(api_key=api_key)
+            # Reuse the pooled connection to the OpenAI API across actions
+            client = openai.OpenAI(api_key=api_key, http_client=get_httpx_client('api.openai.com'))
         except Exception as e:
             logger.error(f"Failed to initialize OpenAI client: {str(e)}")
             self.message_user(
@@ -175,6 +184,7 @@ class ProductAdmin(admin.ModelAdmin):
                 # Store the keywords
                 product.keywords = keywords_text
                 product.save()
+                sync_product_keywords(product)
                 
                 success_count += 1
                 logger.info(f"Generated keywords for product {product.id}: {keywords_text}")
@@ -1,15 +1,34 @@
-import os
+import json
+import base64
+import binascii
 import logging
-import requests
+from datetime import datetime
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_GET
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from django.db.models import Prefetch
+from django.db.models import Prefetch, Q
 from .models import Product, VisualContent, Product, Notification, NotificationSettings
+from .facets import get_search_facets
+from .search import completion_index, get_search_backend, ordered_by_ids
+from .enrichment import get_pokemon, get_weather, fetch_all, EnrichmentUnavailable
+from .outbound import get_metrics
+from .permissions import admin_required
+from .purchases import get_review_eligibility
+from .reviews import (
+    REVIEW_PAGE_SIZE, REVIEW_MAX_PAGE_SIZE, REVIEW_SORTS, DEFAULT_REVIEW_SORT,
+    get_review_page, get_rating_histogram
+)
 
 logger = logging.getLogger(__name__)
-OPENWEATHER_API_KEY = os.environ.get('OPENWEATHER_API_KEY')
+
+# Search API page sizes
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+AUTOCOMPLETE_LIMIT = 8
+
+# Most products the bulk review eligibility API answers for at once
+ELIGIBILITY_MAX_PRODUCTS = 100
 
 def api_products(request):
     """
@@ -61,25 +80,22 @@ def api_product_detail(request, product_id):
             } for v in visuals]
         }
         
-        # Fetch pokemon data if available
+        # Fetch Pokemon and weather data concurrently, so the slowest source sets the latency
+        # rather than their sum. Whatever fails or misses the deadline is left out
+        # instead of failing the whole request.
+        lookups = {}
         if product.pokemon:
-            try:
-                pokemon_data = _fetch_pokemon(product.pokemon)
-                if pokemon_data.get('success'):
-                    response_data['pokemon'] = pokemon_data
-            except Exception as e:
-                logger.error(f"Failed to fetch Pokemon data: {e}")
-                # Don't fail the whole request if Pokemon data fails
-        
-        # Fetch weather data if available
+            lookups['pokemon'] = (get_pokemon, product.pokemon)
         if product.location:
-            try:
-                weather_data = _fetch_weather(product.location)
-                if weather_data.get('success'):
-                    response_data['weather'] = weather_data
-            except Exception as e:
-                logger.error(f"Failed to fetch Weather data: {e}")
-                # Don't fail the whole request if Weather data fails
+            lookups['weather'] = (get_weather, product.location)
+        
+        if lookups:
+            enrichment, missing = fetch_all(lookups)
+            for name, data in enrichment.items():
+                if data.get('success'):
+                    response_data[name] = data
+            if missing:
+                response_data['partial'] = True
         
         return JsonResponse(response_data)
         
@@ -90,9 +106,11 @@ def api_product_detail(request, product_id):
 def api_pokemon_data(request, pokemon_name):
     """Fetch Pokemon data"""
     try:
-        return JsonResponse(_fetch_pokemon(pokemon_name))
+        return JsonResponse(get_pokemon(pokemon_name))
     except ValueError as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=404)
+    except EnrichmentUnavailable as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=503)
     except Exception as e:
         logger.error(f"Pokemon API error: {e}")
         return JsonResponse({'success': False, 'error': 'Pokemon data error'}, status=500)
@@ -100,108 +118,221 @@ def api_pokemon_data(request, pokemon_name):
 def api_weather_data(request, city_name):
     """Fetch weather data"""
     try:
-        return JsonResponse(_fetch_weather(city_name))
+        return JsonResponse(get_weather(city_name))
     except ValueError as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=404)
+    except EnrichmentUnavailable as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=503)
     except Exception as e:
         logger.error(f"Weather API error: {e}")
         return JsonResponse({'success': False, 'error': 'Weather data error'}, status=500)
 
 # --- Helper functions ---
 
-def _fetch_pokemon(name):
-    """Helper to get Pokemon data"""
-    url = f"https://pokeapi.co/api/v2/pokemon/{name.lower()}"
-    resp = requests.get(url, timeout=5)
-    
-    if resp.status_code == 404:
-        raise ValueError(f"Pokemon '{name}' not found")
-    resp.raise_for_status()
-    
-    data = resp.json()
-    return {
-        'success': True,
-        'name': data.get('name', '').capitalize(),
-        'sprite': data.get('sprites', {}).get('front_default', ''),
-        'types': [t['type']['name'].capitalize() for t in data.get('types', [])],
-        'height': data.get('height', 0),
-        'weight': data.get('weight', 0),
-        'stats': {s['stat']['name']: s['base_stat'] for s in data.get('stats', [])}
-    }
-
-def _fetch_weather(city):
-    """Helper to get weather data"""
-    if not OPENWEATHER_API_KEY:
-        raise EnvironmentError("OpenWeather API key not configured")
-
-    url = f"https://api.openweathermap.org/data/2.5/weather?q={city}&appid={OPENWEATHER_API_KEY}&units=metric"
-    resp = requests.get(url, timeout=5)
-
-    if resp.status_code == 404:
-        raise ValueError(f"City '{city}' not found")
-    resp.raise_for_status()
+def _parse_float(value):
+    """Convert a query string value to float, or None if missing/invalid"""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
 
-    data = resp.json()
-    temp_c = data['main']['temp']
-    temp_f = temp_c * 9 / 5 + 32
+def _encode_cursor(kind, values):
+    """Build the opaque cursor handed back to clients for the next page"""
+    return base64.urlsafe_b64encode(json.dumps([kind] + values).encode()).decode()
 
-    return {
-        'success': True,
-        'city': data.get('name', city),
-        'temperature_celsius': temp_c,
-        'temperature_fahrenheit': temp_f,
-        'condition': data['weather'][0]['main'],
-        'description': data['weather'][0]['description'],
-        'icon': data['weather'][0]['icon'],
-        'icon_url': f"https://openweathermap.org/img/wn/{data['weather'][0]['icon']}@2x.png",
-        'humidity': data['main']['humidity'],
-        'wind_speed': data['wind']['speed'],
-        'timestamp': data['dt']
-    }
+def _decode_cursor(kind, cursor):
+    """
+    Read the values out of a cursor, raising ValueError if it is not one of ours
+    - 'newest': [created_at, id] of the last product, for listings newest first
+    - 'ranked': [id, position] of the last product, for ranked search results
+    """
+    try:
+        cursor_kind, first, second = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        if cursor_kind != kind:
+            raise ValueError
+        if kind == 'newest':
+            return datetime.fromisoformat(first), int(second)
+        return int(first), int(second)
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+        raise ValueError('Invalid cursor')
 
 def search_api(request):
-    """API endpoint for searching products with filters"""
+    """
+    API endpoint for searching products with filters
+    
+    Extra query parameters:
+    - limit: page size (default 20, max 100)
+    - cursor: next_cursor from the previous page
+    - fields: comma-separated subset of Product.JSON_FIELDS to return
+    
+    Pages continue after the last product instead of at an offset: listings by their
+    (created_at, id) key, so deep pages cost the same as the first one, and ranked
+    results after the last product's place in the ranking (at most
+    SEARCH_MAX_RESULTS ids). The page's rows are streamed from the database cursor
+    into the JSON body product by product, with categories and visuals loaded in one batch.
+    """
     query = request.GET.get('query', '').strip()
     category = request.GET.get('category', None)
-    min_price = request.GET.get('min_price', None)
-    max_price = request.GET.get('max_price', None)
-    min_rating = request.GET.get('min_rating', None)
+    min_price = _parse_float(request.GET.get('min_price'))
+    max_price = _parse_float(request.GET.get('max_price'))
+    min_rating = _parse_float(request.GET.get('min_rating'))
+    
+    try:
+        limit = min(max(int(request.GET.get('limit', SEARCH_PAGE_SIZE)), 1), SEARCH_MAX_PAGE_SIZE)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid limit'}, status=400)
     
-    # Convert string parameters to appropriate types
-    if min_price:
-        try:
-            min_price = float(min_price)
-        except ValueError:
-            min_price = None
-            
-    if max_price:
-        try:
-            max_price = float(max_price)
-        except ValueError:
-            max_price = None
-            
-    if min_rating:
-        try:
-            min_rating = float(min_rating)
-        except ValueError:
-            min_rating = None
+    cursor = request.GET.get('cursor')
+    
+    fields = None
+    if request.GET.get('fields'):
+        fields = [f.strip() for f in request.GET['fields'].split(',') if f.strip()]
+        unknown = [f for f in fields if f not in Product.JSON_FIELDS]
+        if unknown:
+            return JsonResponse({
+                'success': False,
+                'error': f"Unknown fields: {', '.join(unknown)}"
+            }, status=400)
     
     # Search products with filters
     results = Product.search(query, category, min_price, max_price, min_rating)
     
-    # If no results, suggest similar products
-    suggestions = []
-    if query and not results.exists():
-        suggestions = Product.suggest_similar(query)
+    # Both kinds of page fetch one extra row to know whether there is another page
+    ranked = bool(query) and get_search_backend().ranked
+    try:
+        if ranked:
+            # Ranked ids (cached per search), the page starts after the last product's place
+            product_ids = list(results.values_list('id', flat=True))
+            start = 0
+            if cursor:
+                last_id, position = _decode_cursor('ranked', cursor)
+                # The last product may have left the results since, then its old place is used
+                start = product_ids.index(last_id) + 1 if last_id in product_ids else max(position, 0)
+            rows = ordered_by_ids(Product.objects.all(), product_ids[start:start + limit + 1])
+        else:
+            # SELECT ... WHERE ... AND (created_at < %s OR (created_at = %s AND id < %s))
+            # ORDER BY created_at DESC, id DESC LIMIT %s;
+            results = results.order_by('-created_at', '-id')
+            if cursor:
+                created_at, last_id = _decode_cursor('newest', cursor)
+                results = results.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=last_id))
+            rows = results[:limit + 1]
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    rows = rows.select_related('category').prefetch_related(
+        Prefetch('visuals', queryset=VisualContent.objects.order_by('id'))
+    )
+    
+    # Facet counts for the same search (one cached aggregate query)
+    facets = get_search_facets(query, category, min_price, max_price, min_rating)
+    
+    def stream():
+        yield '{"results": ['
+        last = None
+        has_more = False
+        for i, product in enumerate(rows.iterator(chunk_size=limit + 1)):
+            if i == limit:
+                has_more = True
+                break
+            yield (',' if i else '') + json.dumps(product.to_json(fields))
+            last = product
+        
+        # If no results, suggest similar products
+        suggestions = []
+        if query and last is None and not cursor:
+            suggestions = Product.suggest_similar(query)
+        yield '], "suggestions": '
+        yield json.dumps([product.to_json(fields) for product in suggestions])
+        
+        next_cursor = None
+        if has_more and ranked:
+            next_cursor = _encode_cursor('ranked', [last.id, start + limit])
+        elif has_more:
+            next_cursor = _encode_cursor('newest', [last.created_at.isoformat(), last.id])
+        
+        meta = {
+            'facets': facets,
+            'query': query,
+            'has_more': has_more,
+            'next_cursor': next_cursor,
+        }
+        for key, value in meta.items():
+            yield f', {json.dumps(key)}: {json.dumps(value)}'
+        yield '}'
+    
+    return StreamingHttpResponse(stream(), content_type='application/json')
+
+@require_GET
+def search_autocomplete_api(request):
+    """
+    Search-as-you-type completions from the in-memory completion index
+    (product names, keywords and categories), no database access
+    """
+    query = request.GET.get('q', '').strip()
+    
+    try:
+        limit = min(max(int(request.GET.get('limit', AUTOCOMPLETE_LIMIT)), 1), SEARCH_MAX_PAGE_SIZE)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid limit'}, status=400)
     
-    # Format the response
-    results_data = [product.to_json() for product in results]
-    suggestions_data = [product.to_json() for product in suggestions]
+    completions = completion_index.complete(query, limit=limit) if query else []
     
     return JsonResponse({
-        'results': results_data,
-        'suggestions': suggestions_data,
-        'query': query
+        'success': True,
+        'query': query,
+        'completions': completions
+    })
+
+@require_GET
+def product_reviews_api(request, product_id):
+    """
+    One page of a product's reviews with its star histogram
+    
+    Query parameters:
+    - sort: newest (default), oldest, highest or lowest
+    - cursor: next_cursor from the previous page
+    - limit: page size (default 10, max 50)
+    - rating: only reviews with this many stars
+    """
+    product = get_object_or_404(Product, id=product_id)
+    
+    sort = request.GET.get('sort', DEFAULT_REVIEW_SORT)
+    if sort not in REVIEW_SORTS:
+        return JsonResponse({
+            'success': False,
+            'error': f"Unknown sort, expected one of: {', '.join(REVIEW_SORTS)}"
+        }, status=400)
+    
+    try:
+        limit = min(max(int(request.GET.get('limit', REVIEW_PAGE_SIZE)), 1), REVIEW_MAX_PAGE_SIZE)
+        rating = int(request.GET['rating']) if request.GET.get('rating') else None
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid limit or rating'}, status=400)
+    
+    try:
+        reviews, next_cursor = get_review_page(product, sort, request.GET.get('cursor'), limit, rating)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    return JsonResponse({
+        'success': True,
+        'reviews': [review.to_json() for review in reviews],
+        'next_cursor': next_cursor,
+        'histogram': get_rating_histogram(product),
+        'review_count': product.review_count,
+        'rating': product.rating
+    })
+
+@login_required
+@admin_required
+def outbound_metrics_api(request):
+    """Latency metrics for outbound API calls made by this process, per host"""
+    return JsonResponse({
+        'success': True,
+        'hosts': get_metrics()
     })
 
 @login_required
@@ -394,4 +525,38 @@ def check_review_eligibility(request, product_id):
         'success': True,
         'can_review': can_review,
         'reason': reason
+    })
+
+@login_required
+@require_GET
+def check_review_eligibility_bulk(request):
+    """
+    Check review eligibility for many products at once
+    
+    Query parameters:
+    - product_ids: comma-separated product ids (at most 100)
+    
+    Answered from the user's cached purchased products, without touching the order tables
+    """
+    try:
+        product_ids = list(dict.fromkeys(
+            int(i) for i in request.GET.get('product_ids', '').split(',') if i.strip()
+        ))
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid product_ids'}, status=400)
+    
+    if len(product_ids) > ELIGIBILITY_MAX_PRODUCTS:
+        return JsonResponse({
+            'success': False,
+            'error': f"At most {ELIGIBILITY_MAX_PRODUCTS} products per request"
+        }, status=400)
+    
+    reason = None
+    if request.user.is_review_banned:
+        reason = 'Your review privileges have been suspended'
+    
+    return JsonResponse({
+        'success': True,
+        'can_review': get_review_eligibility(request.user, product_ids),
+        'reason': reason
     })
\ No newline at end of file
@@ -22,10 +22,10 @@ from .forms import (
 import uuid
 import os
 import logging
-import requests
 import json
 from datetime import timedelta
 from django_countries import countries
+from . import outbound
 
 # Setup logging
 logger = logging.getLogger(__name__)
@@ -35,13 +35,8 @@ MAILJET_API_KEY = os.environ.get('MAILJET_API_KEY')
 MAILJET_SECRET_KEY = os.environ.get('MAILJET_API_SECRET')
 IPINFO_API_KEY = os.environ.get('IPINFO_API_KEY')
 
-# Setup mailjet for email sending
-try:
-    from mailjet_rest import Client
-    mailjet = Client(auth=(MAILJET_API_KEY, MAILJET_SECRET_KEY), version='v3.1')
-except ImportError:
-    mailjet = None
-    logger.warning("Mailjet library not installed")
+# Mailjet send API, called through the pooled outbound client
+MAILJET_SEND_URL = 'https://api.mailjet.com/v3.1/send'
 
 # IP tracking for password reset attempts
 ip_reset_attempts = {}
@@ -535,9 +530,13 @@ def check_email_availability(request):
     return JsonResponse({'available': True, 'message': 'Email is available', 'html': False})
 
 # Helper functions
+def _send_mailjet(data):
+    """Send messages through the Mailjet send API"""
+    return outbound.post(MAILJET_SEND_URL, json=data, auth=(MAILJET_API_KEY, MAILJET_SECRET_KEY))
+
 def send_verification_email(user):
     """Send email verification email."""
-    if not mailjet or not all([MAILJET_API_KEY, MAILJET_SECRET_KEY]):
+    if not all([MAILJET_API_KEY, MAILJET_SECRET_KEY]):
         logger.error("Mailjet API keys not configured")
         return False
     
@@ -574,7 +573,7 @@ def send_verification_email(user):
     }
     
     try:
-        result = mailjet.send.create(data=data)
+        result = _send_mailjet(data)
         return result.status_code == 200
     except Exception as e:
         logger.error(f"Error sending verification email: {str(e)}")
@@ -582,7 +581,7 @@ def send_verification_email(user):
 
 def send_password_reset_email(user):
     """Send password reset email."""
-    if not mailjet or not all([MAILJET_API_KEY, MAILJET_SECRET_KEY]):
+    if not all([MAILJET_API_KEY, MAILJET_SECRET_KEY]):
         logger.error("Mailjet API keys not configured")
         return False
     
@@ -620,7 +619,7 @@ def send_password_reset_email(user):
     }
     
     try:
-        result = mailjet.send.create(data=data)
+        result = _send_mailjet(data)
         return result.status_code == 200
     except Exception as e:
         logger.error(f"Error sending password reset email: {str(e)}")
@@ -0,0 +1,182 @@
+# cart_store.py - Anonymous carts kept in the session, only written to the database at checkout or login
+
+import logging
+import uuid
+
+from django.db import transaction
+from django.db.models import OuterRef
+
+from .holds import holds_enabled, transfer_holds
+from .models import Cart, CartItem, Product, VisualContent
+
+logger = logging.getLogger(__name__)
+
+# Session key holding the visitor's cart (session data survives the session key change on login)
+SESSION_CART_KEY = 'cart'
+
+
+def _empty_cart():
+    return {'token': None, 'next_id': 1, 'items': []}
+
+
+class SessionCart:
+    """
+    An anonymous visitor's cart, stored in their session: {'token', 'next_id', 'items': [item, ...]}
+    with items {'id', 'product_id', 'quantity', 'size'}. Item ids are only unique within the cart,
+    token names the cart's stock holds.
+    The session is stored like any other (settings.SESSION_ENGINE), so the cart is shared by every
+    worker and lives as long as the session cookie.
+    """
+
+    def __init__(self, request):
+        self.session = request.session
+        self.data = self.session.get(SESSION_CART_KEY) or _empty_cart()
+
+    @property
+    def token(self):
+        return self.data['token']
+
+    @property
+    def items(self):
+        return self.data['items']
+
+    def find(self, product_id, size):
+        """Get the item for a product and size, or None"""
+        return next((i for i in self.items if i['product_id'] == product_id and i['size'] == size), None)
+
+    def get(self, item_id):
+        """Get an item by id, or None"""
+        return next((i for i in self.items if i['id'] == item_id), None)
+
+    def product_units(self, product_id):
+        """Units of a product in the cart, over all sizes"""
+        return sum(i['quantity'] for i in self.items if i['product_id'] == product_id)
+
+    @property
+    def holder(self):
+        """Name this cart's stock holds are kept under (see holds.py)"""
+        self._ensure_token()
+        return f"session:{self.token}"
+
+    def _ensure_token(self):
+        if not self.token:
+            self.data['token'] = uuid.uuid4().hex
+            self.save()
+
+    def add(self, product_id, quantity, size):
+        """Add quantity of a product, merging with an existing item of the same size, returns the item"""
+        item = self.find(product_id, size)
+        if item:
+            item['quantity'] += quantity
+        else:
+            item = {'id': self.data['next_id'], 'product_id': product_id, 'quantity': quantity, 'size': size}
+            self.data['next_id'] += 1
+            self.items.append(item)
+        self.save()
+        return item
+
+    def update(self, item_id, quantity):
+        """Set an item's quantity, removing it at 0 or less"""
+        if quantity <= 0:
+            self.remove(item_id)
+            return
+        self.get(item_id)['quantity'] = quantity
+        self.save()
+
+    def remove(self, item_id):
+        self.data['items'] = [i for i in self.items if i['id'] != item_id]
+        self.save()
+
+    def save(self):
+        # The items are changed in place, so mark the session as changed explicitly
+        self.session[SESSION_CART_KEY] = self.data
+        self.session.modified = True
+
+    def clear(self):
+        self.session.pop(SESSION_CART_KEY, None)
+        self.data = _empty_cart()
+
+    def _load_products(self):
+        """Get {product_id: product} for the items, with the primary image name, in one query"""
+        if not self.items:
+            return {}
+        return Product.objects.only('id', 'name', 'price', 'quantity').annotate(
+            image=VisualContent.primary_image_name(OuterRef('pk'))
+        ).in_bulk([i['product_id'] for i in self.items])
+
+    @property
+    def total_price(self):
+        prices = dict(Product.objects.filter(id__in=[i['product_id'] for i in self.items]).values_list('id', 'price'))
+        return sum((prices[i['product_id']] * i['quantity'] for i in self.items if i['product_id'] in prices), 0)
+
+    def to_json(self):
+        """Same shape as Cart.to_json, products that no longer exist are left out"""
+        products = self._load_products()
+        items = []
+        total = 0
+        for item in self.items:
+            product = products.get(item['product_id'])
+            if product is None:
+                continue
+            subtotal = product.price * item['quantity']
+            total += subtotal
+            items.append({
+                'id': item['id'],
+                'product_id': product.id,
+                'name': product.name,
+                'price': float(product.price),
+                'quantity': item['quantity'],
+                'size': item['size'],
+                'subtotal': float(subtotal),
+                'image': product.image,
+                'stock_quantity': product.quantity
+            })
+
+        return {
+            'cart_id': None,
+            'total': float(total),
+            'items': items
+        }
+
+    def _existing_items(self):
+        """Items whose product still exists"""
+        existing = set(Product.objects.filter(id__in=[i['product_id'] for i in self.items]).values_list('id', flat=True))
+        return [i for i in self.items if i['product_id'] in existing]
+
+    def persist(self):
+        """Write the cart to a new database Cart for checkout, returns the Cart (the session cart is kept)"""
+        with transaction.atomic():
+            cart = Cart.objects.create(session_id=self.session.session_key)
+            CartItem.objects.bulk_create([
+                CartItem(cart=cart, product_id=i['product_id'], quantity=i['quantity'], size=i['size'])
+                for i in self._existing_items()
+            ])
+        return cart
+
+    def merge_into(self, cart):
+        """Add the items to a user's database cart (on login) and clear the session cart"""
+        items = self._existing_items()
+        if items:
+            existing = {(i.product_id, i.size): i for i in cart.items.all()}
+            new_items = []
+            updated = []
+            for item in items:
+                current = existing.get((item['product_id'], item['size']))
+                if current:
+                    current.quantity += item['quantity']
+                    updated.append(current)
+                else:
+                    new_items.append(CartItem(cart=cart, product_id=item['product_id'],
+                                              quantity=item['quantity'], size=item['size']))
+
+            with transaction.atomic():
+                CartItem.objects.bulk_create(new_items)
+                CartItem.objects.bulk_update(updated, ['quantity'])
+                if holds_enabled() and self.token:
+                    units = {}
+                    for item in cart.items.all():
+                        units[item.product_id] = units.get(item.product_id, 0) + item.quantity
+                    transfer_holds(self.holder, cart.holder, units)
+            logger.info(f"Merged {len(items)} session cart items into cart {cart.id}")
+
+        self.clear()
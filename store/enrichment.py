@@ -0,0 +1,295 @@
+# enrichment.py - Cached access to the external enrichment APIs (PokeAPI, OpenWeather)
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import outbound
+
+logger = logging.getLogger(__name__)
+
+OPENWEATHER_API_KEY = os.environ.get('OPENWEATHER_API_KEY')
+
+# Per-source defaults, any of them can be overridden in settings.ENRICHMENT_SOURCES
+# - ttl: how long a cached answer counts as fresh
+# - stale_ttl: how long after that it is still served while a background refresh runs
+# - negative_ttl: how long "not found" answers are cached
+# - failure_threshold / reset_timeout: circuit breaker, opens after that many failures in a row
+#   and lets one trial request through once reset_timeout seconds have passed
+DEFAULT_SOURCES = {
+    'pokemon': {
+        'base_url': 'https://pokeapi.co/api/v2',
+        'timeout': 5,
+        'ttl': 60 * 60 * 24,
+        'stale_ttl': 60 * 60 * 24 * 7,
+        'negative_ttl': 60 * 60,
+        'failure_threshold': 5,
+        'reset_timeout': 30,
+    },
+    'weather': {
+        'base_url': 'https://api.openweathermap.org/data/2.5',
+        'timeout': 5,
+        'ttl': 60 * 10,
+        'stale_ttl': 60 * 60,
+        'negative_ttl': 60 * 60,
+        'failure_threshold': 5,
+        'reset_timeout': 30,
+    },
+}
+
+
+# Overall time budget for fetch_all (settings.ENRICHMENT_DEADLINE overrides it)
+DEFAULT_DEADLINE = 5
+
+# Shared by every request, so a slow upstream can't pile up unbounded threads
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='enrichment')
+
+
+class EnrichmentUnavailable(Exception):
+    """The upstream API can't be reached right now and nothing usable is cached"""
+
+
+class CircuitBreaker:
+    """
+    Stops calling an upstream API after repeated failures, so an outage costs
+    one fast failure per request instead of a full timeout
+    """
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+
+    @property
+    def is_open(self):
+        return self._opened_at is not None
+
+    def allow(self):
+        """Check whether a call may go out now"""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+
+            # Half-open: let a single trial call through once the reset timeout has passed
+            if not self._trial_running and time.time() - self._opened_at >= self.reset_timeout:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    logger.warning(f"Circuit opened after {self._failures} failures in a row")
+                self._opened_at = time.time()
+
+
+class EnrichmentSource:
+    """
+    One external API behind a shared cache.
+
+    Fresh answers are served from the cache, stale ones are served while a
+    background thread refreshes them, and "not found" answers are cached as
+    well. Fetchers raise ValueError for "not found"; any other exception
+    counts as an upstream failure for the circuit breaker.
+    """
+
+    def __init__(self, name, fetcher):
+        self.name = name
+        self.fetcher = fetcher
+        self._breaker = None
+
+    @property
+    def config(self):
+        overrides = getattr(settings, 'ENRICHMENT_SOURCES', {}).get(self.name, {})
+        return {**DEFAULT_SOURCES[self.name], **overrides}
+
+    @property
+    def breaker(self):
+        if self._breaker is None:
+            config = self.config
+            self._breaker = CircuitBreaker(config['failure_threshold'], config['reset_timeout'])
+        return self._breaker
+
+    def _cache_key(self, key):
+        return f"enrichment_{self.name}_{'-'.join(key.lower().split())}"
+
+    def get(self, key):
+        """Get data for key, raising ValueError if upstream says it doesn't exist"""
+        entry = cache.get(self._cache_key(key))
+
+        if entry is not None:
+            if time.time() - entry['fetched_at'] >= entry['ttl']:
+                self._refresh_in_background(key)
+            return self._unwrap(entry)
+
+        return self._unwrap(self._fetch(key))
+
+    def _unwrap(self, entry):
+        if not entry['found']:
+            raise ValueError(entry['error'])
+        return entry['data']
+
+    def _fetch(self, key):
+        """Call upstream and store the answer (found or not) in the cache"""
+        if not self.breaker.allow():
+            raise EnrichmentUnavailable(f"{self.name} API is temporarily unavailable")
+
+        config = self.config
+        try:
+            data = self.fetcher(config, key)
+        except ValueError as e:
+            # A 404 is a valid answer from a healthy upstream
+            self.breaker.record_success()
+            entry = {'found': False, 'error': str(e), 'ttl': config['negative_ttl']}
+        except Exception as e:
+            self.breaker.record_failure()
+            logger.error(f"{self.name} API error for '{key}': {e}")
+            raise EnrichmentUnavailable(f"{self.name} API error") from e
+        else:
+            self.breaker.record_success()
+            entry = {'found': True, 'data': data, 'ttl': config['ttl']}
+
+        entry['fetched_at'] = time.time()
+        cache.set(self._cache_key(key), entry, entry['ttl'] + config['stale_ttl'])
+        return entry
+
+    def _refresh_in_background(self, key):
+        """Refresh a stale entry without holding up the request (one refresh per key at a time)"""
+        lock_key = f"{self._cache_key(key)}_refreshing"
+        if not cache.add(lock_key, True, self.config['timeout'] * 2):
+            return
+
+        def refresh():
+            try:
+                self._fetch(key)
+            except Exception as e:
+                logger.warning(f"Background refresh of {self.name} '{key}' failed: {e}")
+            finally:
+                cache.delete(lock_key)
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+
+# --- Fetchers ---
+
+def _fetch_pokemon(config, name):
+    """Get Pokemon data from PokeAPI"""
+    url = f"{config['base_url']}/pokemon/{name.lower()}"
+    resp = outbound.get(url, timeout=config['timeout'])
+
+    if resp.status_code == 404:
+        raise ValueError(f"Pokemon '{name}' not found")
+    resp.raise_for_status()
+
+    data = resp.json()
+    return {
+        'success': True,
+        'name': data.get('name', '').capitalize(),
+        'sprite': data.get('sprites', {}).get('front_default', ''),
+        'types': [t['type']['name'].capitalize() for t in data.get('types', [])],
+        'height': data.get('height', 0),
+        'weight': data.get('weight', 0),
+        'stats': {s['stat']['name']: s['base_stat'] for s in data.get('stats', [])}
+    }
+
+
+def _fetch_weather(config, city):
+    """Get current weather for a city from OpenWeather"""
+    url = f"{config['base_url']}/weather"
+    params = {'q': city, 'appid': OPENWEATHER_API_KEY, 'units': 'metric'}
+    resp = outbound.get(url, params=params, timeout=config['timeout'])
+
+    if resp.status_code == 404:
+        raise ValueError(f"City '{city}' not found")
+    resp.raise_for_status()
+
+    data = resp.json()
+    temp_c = data['main']['temp']
+    temp_f = temp_c * 9 / 5 + 32
+
+    return {
+        'success': True,
+        'city': data.get('name', city),
+        'temperature_celsius': temp_c,
+        'temperature_fahrenheit': temp_f,
+        'condition': data['weather'][0]['main'],
+        'description': data['weather'][0]['description'],
+        'icon': data['weather'][0]['icon'],
+        'icon_url': f"https://openweathermap.org/img/wn/{data['weather'][0]['icon']}@2x.png",
+        'humidity': data['main']['humidity'],
+        'wind_speed': data['wind']['speed'],
+        'timestamp': data['dt']
+    }
+
+
+pokemon_source = EnrichmentSource('pokemon', _fetch_pokemon)
+weather_source = EnrichmentSource('weather', _fetch_weather)
+
+
+def get_pokemon(name):
+    """
+    Get Pokemon data (cached)
+    Raises ValueError if the Pokemon doesn't exist and EnrichmentUnavailable if PokeAPI is down
+    """
+    return pokemon_source.get(name)
+
+
+def get_weather(city):
+    """
+    Get weather data for a city (cached)
+    Raises ValueError if the city doesn't exist and EnrichmentUnavailable if OpenWeather is down
+    """
+    if not OPENWEATHER_API_KEY:
+        raise EnvironmentError("OpenWeather API key not configured")
+    return weather_source.get(city)
+
+
+def fetch_all(lookups, deadline=None):
+    """
+    Run several lookups concurrently, e.g. {'pokemon': (get_pokemon, 'pikachu')}
+
+    Waits at most `deadline` seconds overall and returns (results, missing):
+    results maps names to the data of lookups that succeeded in time, missing
+    lists the names that hit an upstream failure or ran out of time. Lookups
+    with no data to give (not found, or the source isn't configured) are in
+    neither. Lookups still running keep going in the background and land in
+    the cache for the next request.
+    """
+    if deadline is None:
+        deadline = getattr(settings, 'ENRICHMENT_DEADLINE', DEFAULT_DEADLINE)
+
+    futures = {_executor.submit(func, arg): name for name, (func, arg) in lookups.items()}
+    done, not_done = wait(futures, timeout=deadline)
+
+    results = {}
+    missing = [futures[f] for f in not_done]
+    for future in done:
+        name = futures[future]
+        try:
+            results[name] = future.result()
+        except (ValueError, EnvironmentError) as e:
+            logger.info(f"No {name} data: {e}")
+        except Exception as e:
+            logger.error(f"Failed to fetch {name} data: {e}")
+            missing.append(name)
+
+    if not_done:
+        logger.warning(f"Enrichment deadline of {deadline}s passed, skipping {', '.join(missing)}")
+    return results, missing
@@ -0,0 +1,137 @@
+# facets.py - Facet counts (category, price, rating) for search results
+
+import hashlib
+import json
+import logging
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from .models import Product
+from .search import RESULTS_VERSION_KEY
+
+logger = logging.getLogger(__name__)
+
+# (key, label, min price, max price) - both inclusive like the min_price / max_price filters
+# (prices have cents, so a bucket ends a cent below the next one), None means unbounded
+PRICE_BUCKETS = (
+    ('under-25', 'Under $25', None, Decimal('24.99')),
+    ('25-50', '$25 - $50', 25, Decimal('49.99')),
+    ('50-100', '$50 - $100', 50, Decimal('99.99')),
+    ('over-100', '$100 & Above', 100, None),
+)
+
+# "N stars & up" buckets, matching the min_rating filter
+RATING_BUCKETS = (4, 3, 2, 1)
+
+FACETS_CACHE_TIMEOUT = 300  # 5 minutes
+
+
+def _count(condition):
+    """Count products, optionally only those matching condition"""
+    if condition:
+        return Count('id', filter=condition)
+    return Count('id')
+
+
+def _bound(price):
+    """Bucket bound as it goes into facet results (JSON has no Decimal)"""
+    return float(price) if price is not None else None
+
+
+def _cache_key(query, category, min_price, max_price, min_rating):
+    """
+    Build a cache key from the normalized search parameters.
+    The search results version is part of the key, so any product or category
+    change moves facets to a fresh key instead of serving stale counts.
+    """
+    params = json.dumps([
+        ' '.join((query or '').lower().split()),
+        category or '',
+        min_price,
+        max_price,
+        min_rating,
+        cache.get(RESULTS_VERSION_KEY, 0),
+    ])
+    return f"search_facets_{hashlib.md5(params.encode()).hexdigest()}"
+
+
+def get_search_facets(query=None, category=None, min_price=None, max_price=None, min_rating=None):
+    """
+    Get facet counts for a search, served from cache when possible
+
+    Each facet ignores its own filter so users can see what switching it would give:
+    category counts respect the price/rating filters, price buckets respect the
+    category/rating filters and rating buckets respect the category/price filters.
+    """
+    key = _cache_key(query, category, min_price, max_price, min_rating)
+    facets = cache.get(key)
+    if facets is None:
+        facets = _compute_facets(query, category, min_price, max_price, min_rating)
+        cache.set(key, facets, FACETS_CACHE_TIMEOUT)
+    return facets
+
+
+def _compute_facets(query, category, min_price, max_price, min_rating):
+    """Compute every facet from a single aggregate query grouped by category"""
+    price_q = Q()
+    if min_price is not None:
+        price_q &= Q(price__gte=min_price)
+    if max_price is not None:
+        price_q &= Q(price__lte=max_price)
+
+    rating_q = Q()
+    if min_rating is not None:
+        rating_q &= Q(rating__gte=min_rating)
+
+    # One conditional count per bucket, so the whole histogram comes back in one row per category
+    aggregates = {'total': _count(price_q & rating_q)}
+
+    for i, (_, _, low, high) in enumerate(PRICE_BUCKETS):
+        bucket_q = Q()
+        if low is not None:
+            bucket_q &= Q(price__gte=low)
+        if high is not None:
+            bucket_q &= Q(price__lte=high)
+        aggregates[f'price_{i}'] = _count(rating_q & bucket_q)
+
+    for stars in RATING_BUCKETS:
+        aggregates[f'rating_{stars}'] = _count(price_q & Q(rating__gte=stars))
+
+    # Only the text query narrows the base set, the filters are applied per facet above
+    rows = Product.search(query).order_by().values('category__name').annotate(**aggregates)
+
+    categories = []
+    price_counts = [0] * len(PRICE_BUCKETS)
+    rating_counts = {stars: 0 for stars in RATING_BUCKETS}
+    total = 0
+
+    for row in rows:
+        if row['total']:
+            categories.append({'name': row['category__name'], 'count': row['total']})
+
+        # Price and rating histograms only cover the selected category
+        if category and row['category__name'] != category:
+            continue
+
+        total += row['total']
+        for i in range(len(PRICE_BUCKETS)):
+            price_counts[i] += row[f'price_{i}']
+        for stars in RATING_BUCKETS:
+            rating_counts[stars] += row[f'rating_{stars}']
+
+    categories.sort(key=lambda c: (-c['count'], c['name']))
+
+    return {
+        'total': total,
+        'categories': categories,
+        'price': [
+            {'key': key, 'label': label, 'min_price': _bound(low), 'max_price': _bound(high), 'count': price_counts[i]}
+            for i, (key, label, low, high) in enumerate(PRICE_BUCKETS)
+        ],
+        'rating': [
+            {'min_rating': stars, 'label': f"{stars} star{'' if stars == 1 else 's'} & up", 'count': rating_counts[stars]}
+            for stars in RATING_BUCKETS
+        ],
+    }
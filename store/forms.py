@@ -6,11 +6,11 @@ from django.core.exceptions import ValidationError
 import os
 import re
 import json
-import requests
 import secrets
 import string
 from django.utils import timezone
 from django.contrib.auth.hashers import check_password
+from . import outbound
 
 
 User = get_user_model()
@@ -227,7 +227,7 @@ def get_country_from_ip():
     """Get user's country based on IP information"""
     try:
         # Call ipapi.co API to get user's country
-        response = requests.get('https://ipapi.co/json/')
+        response = outbound.get('https://ipapi.co/json/')
         if response.status_code == 200:
             data = response.json()
             return data.get('country_name', '')
@@ -0,0 +1,124 @@
+# holds.py - Optional soft reservations: units in a cart are held for a while and counted against
+# the stock everyone else can buy, expired holds stop counting and are swept by release_expired_holds
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .inventory import InsufficientStock
+from .models import Product, StockHold
+
+logger = logging.getLogger(__name__)
+
+# Seconds a cart holds its units after the last change to it
+DEFAULT_HOLD_TTL = 15 * 60
+
+# Most expired holds deleted per statement by the sweeper
+SWEEP_BATCH_SIZE = 1000
+
+
+def holds_enabled():
+    return getattr(settings, 'CART_HOLDS_ENABLED', False)
+
+
+def _hold_ttl():
+    return timedelta(seconds=getattr(settings, 'CART_HOLD_TTL', DEFAULT_HOLD_TTL))
+
+
+def held_by_others(product_ids, holder=None):
+    """Get {product_id: units held by active holds of anyone but holder}"""
+    holds = StockHold.objects.filter(product_id__in=product_ids, expires_at__gt=timezone.now())
+    if holder:
+        holds = holds.exclude(holder=holder)
+    return dict(holds.values('product_id').annotate(units=Sum('quantity')).values_list('product_id', 'units'))
+
+
+def get_available_quantity(product, holder=None):
+    """Stock of a product that holder (or a new visitor) can still add to a cart"""
+    if not holds_enabled():
+        return product.quantity
+    return max(product.quantity - held_by_others([product.id], holder).get(product.id, 0), 0)
+
+
+def apply_available_stock(cart_data, holder):
+    """Rewrite stock_quantity in a cart's JSON to what the cart can still get, in one query"""
+    if not holds_enabled() or not cart_data['items']:
+        return cart_data
+    held = held_by_others({item['product_id'] for item in cart_data['items']}, holder)
+    for item in cart_data['items']:
+        item['stock_quantity'] = max(item['stock_quantity'] - held.get(item['product_id'], 0), 0)
+    return cart_data
+
+
+def set_hold(holder, product_id, quantity):
+    """
+    Hold quantity units of a product for holder (0 releases the hold) and restart its expiry
+    The product row is locked while the other holds are counted, raises InsufficientStock
+    """
+    if not holds_enabled():
+        return
+
+    with transaction.atomic():
+        if quantity <= 0:
+            StockHold.objects.filter(holder=holder, product_id=product_id).delete()
+            return
+
+        product = Product.objects.select_for_update().only('id', 'name', 'quantity').get(id=product_id)
+        available = product.quantity - held_by_others([product_id], holder).get(product_id, 0)
+        if quantity > available:
+            raise InsufficientStock([{
+                'product_id': product_id,
+                'product_name': product.name,
+                'requested': quantity,
+                'available': max(available, 0)
+            }])
+
+        StockHold.objects.update_or_create(
+            holder=holder, product_id=product_id,
+            defaults={'quantity': quantity, 'expires_at': timezone.now() + _hold_ttl()}
+        )
+
+
+def transfer_holds(from_holder, to_holder, units):
+    """
+    Move a cart's holds to another holder after a merge (on login)
+    units is {product_id: units of the product in the merged cart}, stock isn't checked again
+    """
+    if not holds_enabled():
+        return
+
+    expires_at = timezone.now() + _hold_ttl()
+    with transaction.atomic():
+        StockHold.objects.filter(holder=from_holder).delete()
+        StockHold.objects.bulk_create(
+            [StockHold(holder=to_holder, product_id=product_id, quantity=quantity, expires_at=expires_at)
+             for product_id, quantity in units.items()],
+            update_conflicts=True, unique_fields=['holder', 'product'], update_fields=['quantity', 'expires_at']
+        )
+
+
+def release_holds(holder):
+    """Drop every hold of a cart, e.g. once its order is placed"""
+    StockHold.objects.filter(holder=holder).delete()
+
+
+def release_expired_holds(batch_size=SWEEP_BATCH_SIZE):
+    """
+    Delete expired holds in batches, returns the number deleted
+    Expired holds already stop counting against stock, this keeps the table small
+    """
+    now = timezone.now()
+    released = 0
+    while True:
+        ids = list(StockHold.objects.filter(expires_at__lte=now).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            break
+        deleted, _ = StockHold.objects.filter(id__in=ids, expires_at__lte=now).delete()
+        released += deleted
+
+    logger.info(f"Released {released} expired stock holds")
+    return released
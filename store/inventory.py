@@ -0,0 +1,105 @@
+# inventory.py - Stock reservation for checkout: locked, all-or-nothing decrements and releases
+
+import logging
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, When
+
+from .models import Product
+from . import signals
+
+logger = logging.getLogger(__name__)
+
+
+class InsufficientStock(Exception):
+    """Raised by reserve_stock with one entry per product that can't be covered"""
+
+    def __init__(self, items):
+        super().__init__('Some items have insufficient stock')
+        self.items = items
+
+
+def _line_totals(lines):
+    """Add up (product_id, quantity) lines per product, the same product can appear in several sizes"""
+    totals = Counter()
+    for product_id, quantity in lines:
+        totals[product_id] += quantity
+    return totals
+
+
+def reserve_stock(lines, holder=None):
+    """
+    Take stock for (product_id, quantity) lines, all or nothing, must run inside transaction.atomic()
+
+    The product rows are locked in id order, so concurrent checkouts wait on each other instead of
+    deadlocking, and every decrement is a conditional UPDATE ... WHERE quantity >= n as well, which
+    keeps databases without SELECT ... FOR UPDATE (SQLite) from overselling. All the decrements
+    are one UPDATE statement, however many lines the order has.
+    With cart holds enabled, units other carts hold are not available, and holder's own holds
+    (see holds.py) are released along with the order.
+    Returns {product_id: product} as locked (quantities before the decrement), raises InsufficientStock.
+    """
+    from .holds import holds_enabled, held_by_others, release_holds
+
+    totals = _line_totals(lines)
+    locked = Product.objects.select_for_update().filter(id__in=totals).only('id', 'name', 'price', 'quantity')
+    products = {p.id: p for p in locked.order_by('id')}
+    held = held_by_others(totals, holder) if holds_enabled() else {}
+
+    failures = []
+    for product_id, requested in sorted(totals.items()):
+        product = products.get(product_id)
+        available = product.quantity - held.get(product_id, 0) if product else 0
+        if available < requested:
+            failures.append({
+                'product_id': product_id,
+                'product_name': product.name if product else None,
+                'requested': requested,
+                'available': max(available, 0)
+            })
+    if failures:
+        raise InsufficientStock(failures)
+
+    # UPDATE store_product SET quantity = CASE WHEN id = %s THEN quantity - %s ... END
+    # WHERE (id = %s AND quantity >= %s) OR ...;
+    in_stock = Q()
+    for product_id, requested in totals.items():
+        in_stock |= Q(id=product_id, quantity__gte=requested + held.get(product_id, 0))
+    updated = Product.objects.filter(in_stock).update(quantity=Case(
+        *[When(id=product_id, then=F('quantity') - requested) for product_id, requested in totals.items()],
+        default=F('quantity'), output_field=IntegerField()
+    ))
+    if updated != len(totals):
+        # Only reachable without row locks, another checkout got there first
+        # (raising rolls back the rows that were decremented)
+        current = dict(Product.objects.filter(id__in=totals).values_list('id', 'quantity'))
+        raise InsufficientStock([
+            {
+                'product_id': product_id,
+                'product_name': products[product_id].name,
+                'requested': requested,
+                'available': max(current.get(product_id, 0) - held.get(product_id, 0), 0)
+            }
+            for product_id, requested in sorted(totals.items())
+            if current.get(product_id, 0) - held.get(product_id, 0) < requested
+        ])
+
+    if holder and holds_enabled():
+        release_holds(holder)
+
+    transaction.on_commit(lambda: signals.product_data_changed(totals))
+    return products
+
+
+def release_stock(lines):
+    """Put stock for (product_id, quantity) lines back, e.g. when an order is cancelled"""
+    totals = _line_totals(lines)
+    if not totals:
+        return
+    with transaction.atomic():
+        Product.objects.filter(id__in=totals).update(quantity=Case(
+            *[When(id=product_id, then=F('quantity') + quantity) for product_id, quantity in totals.items()],
+            default=F('quantity'), output_field=IntegerField()
+        ))
+        transaction.on_commit(lambda: signals.product_data_changed(totals))
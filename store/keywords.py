@@ -0,0 +1,67 @@
+# keywords.py - Keep the normalized ProductKeyword table in sync with Product.keywords
+
+import logging
+
+from django.db import transaction
+
+from .models import Product, ProductKeyword
+
+logger = logging.getLogger(__name__)
+
+MAX_KEYWORD_LENGTH = ProductKeyword._meta.get_field('name').max_length
+
+
+def normalize_keyword(keyword):
+    """Lowercase a keyword and collapse its whitespace"""
+    return ' '.join(keyword.lower().split())[:MAX_KEYWORD_LENGTH]
+
+
+def parse_keywords(text):
+    """Split comma-separated keywords into unique normalized names, keeping their order"""
+    names = (normalize_keyword(k) for k in (text or '').split(','))
+    return list(dict.fromkeys(name for name in names if name))
+
+
+def _get_or_create_keywords(names):
+    """Get ProductKeyword rows for names, creating the missing ones, as {name: keyword}"""
+    if not names:
+        return {}
+    ProductKeyword.objects.bulk_create(
+        [ProductKeyword(name=name) for name in names],
+        ignore_conflicts=True
+    )
+    return {k.name: k for k in ProductKeyword.objects.filter(name__in=names)}
+
+
+def sync_product_keywords(product):
+    """Point product.keyword_tags at the keywords in product.keywords"""
+    keywords = _get_or_create_keywords(parse_keywords(product.keywords))
+    product.keyword_tags.set(keywords.values())
+
+
+def backfill_keywords(batch_size=500):
+    """Rebuild keyword_tags for every product from its keywords text, returns the number of links"""
+    products = list(Product.objects.values_list('id', 'keywords'))
+    parsed = {product_id: parse_keywords(text) for product_id, text in products}
+    all_names = sorted({name for names in parsed.values() for name in names})
+
+    Through = Product.keyword_tags.through
+    with transaction.atomic():
+        keyword_ids = {name: k.id for name, k in _get_or_create_keywords(all_names).items()}
+        links = [
+            Through(product_id=product_id, productkeyword_id=keyword_ids[name])
+            for product_id, names in parsed.items()
+            for name in names
+        ]
+        Through.objects.all().delete()
+        Through.objects.bulk_create(links, batch_size=batch_size)
+
+    logger.info(f"Linked {len(products)} products to {len(all_names)} keywords ({len(links)} links)")
+    return len(links)
+
+
+def products_with_keywords(names):
+    """Subquery of product ids tagged with any of the given keywords (indexed equality join)"""
+    return Product.keyword_tags.through.objects.filter(
+        productkeyword__name__in=[normalize_keyword(name) for name in names]
+    ).values('product_id')
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from store.keywords import backfill_keywords
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the normalized product keyword links from the comma-separated Product.keywords text'
+
+    def handle(self, *args, **options):
+        links = backfill_keywords()
+        self.stdout.write(self.style.SUCCESS(f"Stored {links} product keyword links"))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from store.view_stats import VIEW_RETENTION_DAYS, compact_views
+
+
+class Command(BaseCommand):
+    help = 'Roll raw product views into daily aggregates and prune old raw views (run daily)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retention-days', type=int, default=VIEW_RETENTION_DAYS,
+            help='Days of raw views to keep'
+        )
+
+    def handle(self, *args, **options):
+        days, deleted = compact_views(options['retention_days'])
+        self.stdout.write(self.style.SUCCESS(f"Compacted {days} days of views, pruned {deleted} raw views"))
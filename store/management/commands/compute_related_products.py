@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from store.related import RELATED_PRODUCTS_COUNT, rebuild_related_products
+
+
+class Command(BaseCommand):
+    help = 'Recompute the "You May Also Like" related products table (run after catalog changes, e.g. nightly)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--count', type=int, default=RELATED_PRODUCTS_COUNT,
+            help='Related products stored per product'
+        )
+
+    def handle(self, *args, **options):
+        rows = rebuild_related_products(options['count'])
+        self.stdout.write(self.style.SUCCESS(f"Stored {rows} related products"))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from store.view_buffer import flush_views
+
+
+class Command(BaseCommand):
+    help = 'Write all buffered product views and interest updates to the database'
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            processed = flush_views()
+            if not processed:
+                break
+            total += processed
+
+        self.stdout.write(self.style.SUCCESS(f"Flushed {total} buffered product views"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from store.popularity import reconcile_popularity
+
+
+class Command(BaseCommand):
+    help = 'Recompute product popularity counters from order items (run periodically, e.g. hourly)'
+
+    def handle(self, *args, **options):
+        count = reconcile_popularity()
+        self.stdout.write(self.style.SUCCESS(f"Reconciled popularity counters for {count} products"))
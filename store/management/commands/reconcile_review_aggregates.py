@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from store.reviews import reconcile_review_aggregates
+
+
+class Command(BaseCommand):
+    help = 'Recompute product review counts, rating sums, star histograms and ratings from the reviews'
+
+    def handle(self, *args, **options):
+        fixed = reconcile_review_aggregates()
+        self.stdout.write(self.style.SUCCESS(f"Fixed review aggregates for {fixed} products"))
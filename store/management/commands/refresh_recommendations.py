@@ -0,0 +1,35 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from store.models import User
+from store.recommendations import refresh_recommendations
+
+
+class Command(BaseCommand):
+    help = 'Recompute stored product recommendations for recently active users (run on a schedule, e.g. nightly)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=30,
+            help='Only refresh users who logged in within this many days'
+        )
+        parser.add_argument(
+            '--user', dest='username',
+            help='Only refresh this user'
+        )
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(is_active=True)
+        if options['username']:
+            users = users.filter(username=options['username'])
+        else:
+            users = users.filter(last_login__gte=timezone.now() - timedelta(days=options['days']))
+
+        count = 0
+        for user in users.iterator():
+            refresh_recommendations(user)
+            count += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Refreshed recommendations for {count} users"))
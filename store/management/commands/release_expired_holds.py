@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from store.holds import release_expired_holds
+
+
+class Command(BaseCommand):
+    help = 'Delete expired cart stock holds in bulk (run on a schedule, e.g. every few minutes)'
+
+    def handle(self, *args, **options):
+        released = release_expired_holds()
+        self.stdout.write(self.style.SUCCESS(f"Released {released} expired stock holds"))
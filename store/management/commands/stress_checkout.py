@@ -0,0 +1,103 @@
+import json
+import threading
+import uuid
+from collections import Counter
+
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+
+from store.models import Cart, CartItem, Order, Product, User
+from store.popularity import reconcile_popularity
+from store.views import checkout
+
+
+class Command(BaseCommand):
+    help = (
+        'Concurrency harness for checkout: many users check out the same product at once from '
+        'separate threads, then the final stock is checked for overselling. Local databases only.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('product_id', type=int, help='Product every thread tries to buy')
+        parser.add_argument('--threads', type=int, default=20, help='Concurrent checkouts')
+        parser.add_argument('--stock', type=int, default=10, help='Stock to start from')
+        parser.add_argument('--quantity', type=int, default=1, help='Units per checkout')
+        parser.add_argument(
+            '--keep', action='store_true',
+            help="Keep the test users and orders and don't restore the product's stock"
+        )
+
+    def handle(self, *args, **options):
+        try:
+            product = Product.objects.get(id=options['product_id'])
+        except Product.DoesNotExist:
+            raise CommandError(f"Product {options['product_id']} does not exist")
+
+        threads, stock, quantity = options['threads'], options['stock'], options['quantity']
+        original_stock = product.quantity
+        Product.objects.filter(id=product.id).update(quantity=stock)
+
+        run = uuid.uuid4().hex[:8]
+        users = []
+        for i in range(threads):
+            user = User(username=f"stress_{run}_{i}", email=f"stress_{run}_{i}@example.com")
+            user.set_unusable_password()
+            user.save()
+            cart = Cart.objects.create(user=user)
+            CartItem.objects.create(cart=cart, product=product, quantity=quantity)
+            users.append(user)
+
+        factory = RequestFactory()
+        start = threading.Barrier(threads)
+        results = Counter()
+        lock = threading.Lock()
+
+        def buy(user):
+            request = factory.post('/api/checkout/', json.dumps({
+                'full_name': user.username,
+                'email': user.email,
+                'shipping_address': 'Stress test',
+                'payment_method': 'cod'
+            }), content_type='application/json')
+            request.user = user
+            request.session = SessionStore()
+            try:
+                start.wait()
+                response = checkout(request)
+                body = json.loads(response.content)
+                outcome = 'ordered' if body.get('success') else body.get('error', 'failed')
+            except Exception as e:
+                outcome = f"exception: {e}"
+            finally:
+                # Threads get their own database connection, don't leave it open
+                connection.close()
+            with lock:
+                results[outcome] += 1
+
+        workers = [threading.Thread(target=buy, args=(user,)) for user in users]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        final_stock = Product.objects.filter(id=product.id).values_list('quantity', flat=True).get()
+        orders = Order.objects.filter(user__in=users)
+        ordered_units = sum(item.quantity for order in orders.prefetch_related('items') for item in order.items.all())
+
+        for outcome, count in results.most_common():
+            self.stdout.write(f"{count:>5}  {outcome}")
+        self.stdout.write(f"Stock {stock} -> {final_stock}, {ordered_units} units ordered")
+
+        consistent = final_stock >= 0 and stock - final_stock == ordered_units
+        if not options['keep']:
+            orders.delete()
+            User.objects.filter(id__in=[u.id for u in users]).delete()
+            Product.objects.filter(id=product.id).update(quantity=original_stock)
+            reconcile_popularity()
+
+        if consistent:
+            self.stdout.write(self.style.SUCCESS('No overselling: stock matches the orders placed'))
+        else:
+            raise CommandError('Stock does not match the orders placed')
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.20 on 2026-10-18 10:56
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0018_relatedproduct'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductPopularity',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='popularity', serialize=False, to='store.product')),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('units_sold', models.PositiveIntegerField(default=0)),
+                ('units_7d', models.PositiveIntegerField(default=0)),
+                ('units_30d', models.PositiveIntegerField(default=0)),
+                ('reconciled_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'product popularity',
+                'indexes': [models.Index(fields=['-order_count'], name='popularity_order_count_idx'), models.Index(fields=['-units_7d'], name='popularity_units_7d_idx'), models.Index(fields=['-units_30d'], name='popularity_units_30d_idx')],
+            },
+        ),
+    ]
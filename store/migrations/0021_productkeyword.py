@@ -0,0 +1,28 @@
+# Generated by Django 4.2.20 on 2026-10-18 10:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0020_userrecommendation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductKeyword',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='keyword_tags',
+            field=models.ManyToManyField(blank=True, related_name='products', to='store.productkeyword'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.20 on 2026-10-18 11:01
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_review_aggregates(apps, schema_editor):
+    Product = apps.get_model('store', 'Product')
+    Review = apps.get_model('store', 'Review')
+
+    totals = Review.objects.values('product_id').annotate(count=Count('id'), total=Sum('rating')).order_by()
+    for row in totals:
+        Product.objects.filter(id=row['product_id']).update(review_count=row['count'], rating_sum=row['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0022_view_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_review_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.20 on 2026-10-18 11:32
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0025_stockhold'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='productview',
+            name='viewed_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+    ]
@@ -2,9 +2,11 @@ from django.db import models
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.contrib.auth.hashers import make_password
 from django.core.validators import MinValueValidator, MaxValueValidator, MinLengthValidator, RegexValidator
-from django.db.models import Q
+from django.db.models import F, Sum, Value, OuterRef, Subquery, DecimalField, ExpressionWrapper
+from django.db.models.functions import Coalesce, Concat
 from django.conf import settings
 from django.utils import timezone
+from django.core.cache import cache
 
 class Category(models.Model):
     name = models.CharField(max_length=100, unique=True)
@@ -173,12 +175,11 @@ class User(AbstractBaseUser, PermissionsMixin):
     def has_purchased_product(self, product_id):
         """
         Check if the user has purchased a specific product in any of their orders
+        (cancelled and refunded orders don't count)
         """
-        # Check if user has ordered this product
-        return OrderItem.objects.filter(
-            order__user=self,
-            product_id=product_id
-        ).exists()
+        # Answered from the user's cached set of purchased product ids (see purchases.py)
+        from .purchases import get_purchased_product_ids
+        return int(product_id) in get_purchased_product_ids(self.id)
     
     def can_review_product(self, product_id):
         """
@@ -197,6 +198,20 @@ class User(AbstractBaseUser, PermissionsMixin):
         return self.has_purchased_product(product_id)
 
 
+class ProductKeyword(models.Model):
+    """
+    A normalized (lowercase) product keyword, linked to products through Product.keyword_tags
+    Kept in sync with the comma-separated Product.keywords text by keywords.sync_product_keywords
+    """
+    name = models.CharField(max_length=100, unique=True)
+    
+    class Meta:
+        ordering = ['name']
+    
+    def __str__(self):
+        return self.name
+
+
 class Product(models.Model):
     """
     Product model for storing product information
@@ -209,11 +224,21 @@ class Product(models.Model):
         default=0.0, 
         validators=[MinValueValidator(0.0), MaxValueValidator(5.0)]
     )
+    # Review aggregates kept up to date by reviews.py, rating is rating_sum / review_count once reviewed
+    review_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    # Star histogram, rating_<n>_count is the number of n star reviews
+    rating_1_count = models.PositiveIntegerField(default=0)
+    rating_2_count = models.PositiveIntegerField(default=0)
+    rating_3_count = models.PositiveIntegerField(default=0)
+    rating_4_count = models.PositiveIntegerField(default=0)
+    rating_5_count = models.PositiveIntegerField(default=0)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='products')
     pokemon = models.CharField(max_length=100, blank=True, null=True)
     location = models.CharField(max_length=100, blank=True, null=True)
     keywords = models.TextField(blank=True, null=True, help_text="Comma-separated keywords for the product")
+    keyword_tags = models.ManyToManyField(ProductKeyword, related_name='products', blank=True)
     quantity = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -229,26 +254,46 @@ class Product(models.Model):
     def __str__(self):
         return self.name
         
-    def to_json(self):
-        """Convert product to JSON serializable dictionary"""
-        return {
+    # Keys produced by to_json, in output order
+    JSON_FIELDS = (
+        'id', 'name', 'description', 'feature', 'rating', 'price', 'category',
+        'pokemon', 'location', 'keywords', 'quantity', 'image'
+    )
+        
+    def to_json(self, fields=None):
+        """
+        Convert product to JSON serializable dictionary
+        Pass fields to only include (and only look up) some of the JSON_FIELDS
+        """
+        data = {
             'id': self.id,
             'name': self.name,
             'description': self.description,
             'feature': self.feature,
             'rating': float(self.rating),
             'price': float(self.price),
-            'category': self.category.name,
             'pokemon': self.pokemon,
             'location': self.location,
             'keywords': self.keywords,
             'quantity': self.quantity,
-            'image': self.get_primary_image_name()
         }
         
+        # These two touch related tables, so skip them when they're not wanted
+        if fields is None or 'category' in fields:
+            data['category'] = self.category.name
+        if fields is None or 'image' in fields:
+            data['image'] = self.get_primary_image_name()
+        
+        wanted = fields if fields is not None else self.JSON_FIELDS
+        return {field: data[field] for field in wanted if field in data}
+        
     def get_primary_image_name(self):
         """Get the primary image filename for this product"""
-        visual = self.visuals.first()
+        # Use prefetched visuals when available to avoid an extra query per product
+        if 'visuals' in getattr(self, '_prefetched_objects_cache', {}):
+            visual = min(self.visuals.all(), key=lambda v: v.id, default=None)
+        else:
+            visual = self.visuals.first()
         if visual:
             return f"{visual.short_name}.{visual.file_type}"
         return "default.jpg"
@@ -269,17 +314,24 @@ class Product(models.Model):
     def search(cls, query=None, category=None, min_price=None, max_price=None, min_rating=None):
         """
         Search products with filters
+        Results matching a query come back ranked by relevance (see search.py),
+        filter-only results newest first. The ordered ids are cached per normalized
+        search until a product or category changes.
         """
+        from .search import get_search_backend, search_results_key, ordered_by_ids
+
+        # Serve repeated searches from the result cache
+        cache_key = search_results_key(query, category, min_price, max_price, min_rating)
+        product_ids = cache.get(cache_key)
+        if product_ids is not None:
+            return ordered_by_ids(cls.objects.filter(is_listed=True), product_ids)
 
         # Start with is_listed=True filter
         products = cls.objects.filter(is_listed=True)
 
-        # Filter by query (search in name and description)
+        # Filter by query through the configured search backend (ranked full-text index by default)
         if query:
-            products = products.filter(
-                Q(name__icontains=query) | 
-                Q(description__icontains=query)
-            )
+            products = get_search_backend().filter_queryset(products, query)
         
         # Apply other filters
         if category:
@@ -294,45 +346,35 @@ class Product(models.Model):
         if min_rating is not None:
             products = products.filter(rating__gte=min_rating)
         
-        return products
+        if not products.ordered:
+            products = products.order_by('-created_at', '-id')
+        
+        # Only cache result lists of a sensible size, broad listings stay plain querysets
+        max_results = getattr(settings, 'SEARCH_MAX_RESULTS', 500)
+        product_ids = list(products.values_list('id', flat=True)[:max_results + 1])
+        if len(product_ids) > max_results:
+            return products
+        
+        cache.set(cache_key, product_ids, getattr(settings, 'SEARCH_RESULTS_CACHE_TIMEOUT', 600))
+        return ordered_by_ids(products, product_ids)
         
     @classmethod
     def suggest_similar(cls, query):
         """
         Find similar products based on name similarity when no exact matches found
-        Returns products with partial word matches sorted by relevance
+        Returns products sorted by relevance, using the trigram index in search.py
         """
         if not query:
             return cls.objects.none()
         
-        # Break query into words for better matching
-        query_words = query.lower().split()
-        
-        # Build a complex query to find products with similar names
-        name_q = Q()
-        
-        # Match each word in the query
-        for word in query_words:
-            if len(word) > 2:  # Only match on words with more than 2 characters
-                name_q |= Q(name__icontains=word)
+        from .search import trigram_index
         
-        # Find products with similar names
-        similar_products = cls.objects.filter(name_q, is_listed=True)
+        # Products whose names start with the query come first, then by trigram overlap
+        product_ids = trigram_index.similar(query, limit=8)
         
-        # If no matches found by name words, try fuzzy matching using trigrams
-        if not similar_products.exists() and len(query) > 3:
-            # Find products where at least part of the name matches
-            for i in range(len(query) - 2):
-                trigram = query[i:i+3].lower()
-                if len(trigram) == 3:
-                    similar_products |= cls.objects.filter(name__icontains=trigram)
-        
-        # Sort by relevance - products whose names start with the query should appear first
-        result_list = list(similar_products)
-        result_list.sort(key=lambda p: (not p.name.lower().startswith(query.lower()), p.name))
-        
-        # Return top suggestions (limit to avoid overwhelming the user)
-        return result_list[:8]
+        # Fetch the suggestions in one query and keep the ranking order
+        products = cls.objects.select_related('category').prefetch_related('visuals').in_bulk(product_ids)
+        return [products[product_id] for product_id in product_ids if product_id in products]
 
 class VisualContent(models.Model):
     """
@@ -353,6 +395,17 @@ class VisualContent(models.Model):
         css_class = css_override if css_override else self.css_class
         return f'<img class="{css_class}" alt="{self.description}" src="/static/images/{self.short_name}.{self.file_type}">'
     
+    @classmethod
+    def primary_image_name(cls, product_ref):
+        """
+        Expression for a product's first visual file name, like Product.get_primary_image_name
+        but usable as an annotation (product_ref is an OuterRef to the product id)
+        """
+        first_visual = cls.objects.filter(product=product_ref).order_by('id').annotate(
+            file_name=Concat('short_name', Value('.'), 'file_type')
+        ).values('file_name')[:1]
+        return Coalesce(Subquery(first_visual), Value('default.jpg'))
+    
     def to_json(self):
         """Convert visual content to JSON serializable dictionary"""
         return {
@@ -404,11 +457,95 @@ class ProductView(models.Model):
     """
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='product_views')
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='views')
-    viewed_at = models.DateTimeField(auto_now_add=True)
+    viewed_at = models.DateTimeField(default=timezone.now, db_index=True)
     
     def __str__(self):
         return f"{self.user.username} viewed {self.product.name}"
 
+class ProductViewDaily(models.Model):
+    """
+    Views of a product per day, rolled up from ProductView by the compact_product_views command
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_views')
+    date = models.DateField()
+    view_count = models.PositiveIntegerField(default=0)
+    unique_users = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ('product', 'date')
+        indexes = [models.Index(fields=['date'], name='productviewdaily_date_idx')]
+    
+    def __str__(self):
+        return f"{self.product.name} on {self.date}: {self.view_count} views"
+
+class UserViewDaily(models.Model):
+    """
+    Views of a product by a user per day, rolled up from ProductView by the compact_product_views command
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_views')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_user_views')
+    date = models.DateField()
+    view_count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ('user', 'product', 'date')
+        indexes = [models.Index(fields=['user', 'date'], name='userviewdaily_user_date_idx')]
+    
+    def __str__(self):
+        return f"{self.user.username} viewed {self.product.name} {self.view_count} times on {self.date}"
+
+class RelatedProduct(models.Model):
+    """
+    Precomputed "You May Also Like" entry: the rank-th most similar product to product
+    Rebuilt in batch by the compute_related_products management command
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='related_entries')
+    related_product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+    
+    class Meta:
+        unique_together = ('product', 'rank')
+        ordering = ['product', 'rank']
+    
+    def __str__(self):
+        return f"{self.product.name} -> {self.related_product.name} (#{self.rank})"
+
+class ProductPopularity(models.Model):
+    """
+    Order counters per product, bumped at checkout and recomputed from order items
+    by the reconcile_popularity management command (which also rolls the 7/30-day windows)
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='popularity')
+    order_count = models.PositiveIntegerField(default=0)
+    units_sold = models.PositiveIntegerField(default=0)
+    units_7d = models.PositiveIntegerField(default=0)
+    units_30d = models.PositiveIntegerField(default=0)
+    reconciled_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name_plural = 'product popularity'
+        indexes = [
+            models.Index(fields=['-order_count'], name='popularity_order_count_idx'),
+            models.Index(fields=['-units_7d'], name='popularity_units_7d_idx'),
+            models.Index(fields=['-units_30d'], name='popularity_units_30d_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.product.name}: {self.order_count} orders, {self.units_sold} units"
+
+class UserRecommendation(models.Model):
+    """
+    Ranked product ids recommended to a user, computed by recommendations.py
+    Dropped when the user's interests change and refreshed by the refresh_recommendations command
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='recommendation')
+    product_ids = models.JSONField(default=list)
+    computed_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{len(self.product_ids)} recommendations for {self.user.username}"
+
 class Review(models.Model):
     """
     Review model for product reviews
@@ -420,6 +557,13 @@ class Review(models.Model):
     rating = models.IntegerField(validators=[MinValueValidator(1), MaxValueValidator(5)])
     comment = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination of a product's reviews, newest/oldest and by stars
+            models.Index(fields=['product', 'created_at', 'id'], name='review_product_created_idx'),
+            models.Index(fields=['product', 'rating', 'created_at', 'id'], name='review_product_rating_idx'),
+        ]
     
     def __str__(self):
         return f"Review for {self.product.name} by {self.user.username}"
@@ -460,8 +604,58 @@ class Cart(models.Model):
     
     @property
     def total_price(self):
-        """Calculate total price of items in cart"""
-        return sum(item.subtotal for item in self.items.all())
+        """Calculate total price of items in cart (one SUM query)"""
+        subtotal = ExpressionWrapper(
+            F('product__price') * F('quantity'),
+            output_field=DecimalField(max_digits=12, decimal_places=2)
+        )
+        return self.items.aggregate(total=Sum(subtotal))['total'] or 0
+    
+    @property
+    def holder(self):
+        """Name this cart's stock holds are kept under (see holds.py)"""
+        return f"cart:{self.id}"
+    
+    def product_units(self, product_id):
+        """Units of a product in the cart, over all sizes"""
+        return self.items.filter(product_id=product_id).aggregate(units=Sum('quantity'))['units'] or 0
+    
+    def get_display_items(self):
+        """
+        Cart items with their products and primary image name, all in one query
+        (image is the first visual's file name, like Product.get_primary_image_name)
+        """
+        return self.items.select_related('product').only(
+            'id', 'cart', 'quantity', 'size', 'product__id', 'product__name', 'product__price', 'product__quantity'
+        ).annotate(
+            image=VisualContent.primary_image_name(OuterRef('product_id'))
+        ).order_by('id')
+    
+    def to_json(self):
+        """Convert cart to the JSON served to the cart drawer, the total is added up in the same pass"""
+        items = []
+        total = 0
+        for item in self.get_display_items():
+            product = item.product
+            subtotal = item.subtotal
+            total += subtotal
+            items.append({
+                'id': item.id,
+                'product_id': product.id,
+                'name': product.name,
+                'price': float(product.price),
+                'quantity': item.quantity,
+                'size': item.size,
+                'subtotal': float(subtotal),
+                'image': item.image,
+                'stock_quantity': product.quantity
+            })
+        
+        return {
+            'cart_id': self.id,
+            'total': float(total),
+            'items': items
+        }
     
     @classmethod
     def get_or_create_cart(cls, user=None, session_id=None):
@@ -544,6 +738,26 @@ class CartItem(models.Model):
         """Calculate subtotal for this cart item"""
         return self.product.price * self.quantity
 
+class StockHold(models.Model):
+    """
+    Units of a product held by a cart until expires_at (see holds.py)
+    holder is 'cart:<id>' for a user's cart or 'session:<token>' for an anonymous one
+    """
+    holder = models.CharField(max_length=64)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='holds')
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+    
+    class Meta:
+        unique_together = ('holder', 'product')
+        indexes = [
+            models.Index(fields=['product', 'expires_at'], name='stockhold_product_idx'),
+            models.Index(fields=['expires_at'], name='stockhold_expires_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.quantity}x {self.product_id} held by {self.holder} until {self.expires_at}"
+
 class Order(models.Model):
     """
     Order model for completed purchases
@@ -0,0 +1,177 @@
+# outbound.py - Shared HTTP clients for outbound API calls (connection pooling, retries, latency metrics)
+
+import logging
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+# Defaults for every host, overridden by settings.OUTBOUND_HTTP['default'] and then
+# by settings.OUTBOUND_HTTP[<host>] (host as in the URL, including a non-default port)
+# - pool_maxsize: keep-alive connections kept open to the host
+# - retries / backoff_factor / status_forcelist: retry policy for idempotent requests
+#   (connection errors and the listed statuses, waiting backoff_factor * 2^n between tries)
+DEFAULT_CONFIG = {
+    'timeout': 5,
+    'pool_maxsize': 10,
+    'retries': 2,
+    'backoff_factor': 0.3,
+    'status_forcelist': (502, 503, 504),
+}
+
+# How many recent calls per host the latency percentiles are computed from
+METRICS_SAMPLE_SIZE = 500
+
+_lock = threading.Lock()
+_sessions = {}
+_httpx_clients = {}
+_metrics = {}
+
+
+def get_config(host):
+    """Get the HTTP client settings for a host"""
+    overrides = getattr(settings, 'OUTBOUND_HTTP', {})
+    return {**DEFAULT_CONFIG, **overrides.get('default', {}), **overrides.get(host, {})}
+
+
+# --- Metrics ---
+
+class HostMetrics:
+    """Call counts and latency for one host"""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.samples = deque(maxlen=METRICS_SAMPLE_SIZE)
+
+    def record(self, elapsed, ok):
+        self.requests += 1
+        self.total_time += elapsed
+        self.max_time = max(self.max_time, elapsed)
+        self.samples.append(elapsed)
+        if not ok:
+            self.errors += 1
+
+    def snapshot(self):
+        samples = sorted(self.samples)
+
+        def percentile(p):
+            if not samples:
+                return 0
+            return round(samples[min(len(samples) - 1, int(len(samples) * p))] * 1000, 1)
+
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'avg_ms': round(self.total_time / self.requests * 1000, 1) if self.requests else 0,
+            'p50_ms': percentile(0.5),
+            'p95_ms': percentile(0.95),
+            'max_ms': round(self.max_time * 1000, 1),
+        }
+
+
+def _record(host, elapsed, ok):
+    with _lock:
+        metrics = _metrics.get(host)
+        if metrics is None:
+            metrics = _metrics[host] = HostMetrics()
+        metrics.record(elapsed, ok)
+
+
+def get_metrics():
+    """Get latency metrics for every host called by this process"""
+    with _lock:
+        return {host: metrics.snapshot() for host, metrics in sorted(_metrics.items())}
+
+
+# --- requests ---
+
+def get_session(host):
+    """Get the pooled requests session for a host"""
+    with _lock:
+        session = _sessions.get(host)
+        if session is None:
+            config = get_config(host)
+            retry = Retry(
+                total=config['retries'],
+                backoff_factor=config['backoff_factor'],
+                status_forcelist=config['status_forcelist'],
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=config['pool_maxsize'], max_retries=retry)
+            session = requests.Session()
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _sessions[host] = session
+        return session
+
+
+def request(method, url, **kwargs):
+    """Send a request through the host's pooled session (same arguments as requests.request)"""
+    host = urlsplit(url).netloc
+    kwargs.setdefault('timeout', get_config(host)['timeout'])
+
+    start = time.perf_counter()
+    ok = False
+    try:
+        response = get_session(host).request(method, url, **kwargs)
+        ok = response.status_code < 500
+        return response
+    finally:
+        _record(host, time.perf_counter() - start, ok)
+
+
+def get(url, **kwargs):
+    return request('GET', url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request('POST', url, **kwargs)
+
+
+# --- httpx (for SDKs built on it, like OpenAI) ---
+
+class _TimedTransport(httpx.HTTPTransport):
+    """httpx transport that records per-host latency"""
+
+    def handle_request(self, request):
+        host = request.url.netloc.decode()
+        start = time.perf_counter()
+        ok = False
+        try:
+            response = super().handle_request(request)
+            ok = response.status_code < 500
+            return response
+        finally:
+            _record(host, time.perf_counter() - start, ok)
+
+
+def get_httpx_client(host):
+    """
+    Get a pooled httpx client for a host
+    httpx only retries failed connects, SDKs using this client keep their own retry policy on top
+    """
+    with _lock:
+        client = _httpx_clients.get(host)
+        if client is None:
+            config = get_config(host)
+            limits = httpx.Limits(
+                max_connections=config['pool_maxsize'],
+                max_keepalive_connections=config['pool_maxsize'],
+            )
+            client = httpx.Client(
+                transport=_TimedTransport(limits=limits, retries=config['retries']),
+                timeout=config['timeout'],
+            )
+            _httpx_clients[host] = client
+        return client
@@ -0,0 +1,99 @@
+# popularity.py - Maintained order counters behind the "popular" product listing
+
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Q, Sum, When
+from django.utils import timezone
+
+from .models import OrderItem, Product, ProductPopularity
+
+logger = logging.getLogger(__name__)
+
+# Counter each ranking window sorts on
+WINDOW_FIELDS = {
+    None: 'order_count',
+    '7d': 'units_7d',
+    '30d': 'units_30d',
+}
+
+
+def record_order(items):
+    """
+    Bump the counters for a new order
+    items is an iterable of (product_id, quantity), one per order item
+    """
+    totals = defaultdict(lambda: [0, 0])
+    for product_id, quantity in items:
+        if product_id is None:
+            continue
+        totals[product_id][0] += 1
+        totals[product_id][1] += quantity
+
+    if not totals:
+        return
+
+    with transaction.atomic():
+        ProductPopularity.objects.bulk_create(
+            [ProductPopularity(product_id=product_id) for product_id in totals],
+            ignore_conflicts=True
+        )
+        # One UPDATE for every product in the order
+        def bump(field, index):
+            return Case(
+                *[When(product_id=product_id, then=F(field) + counts[index]) for product_id, counts in totals.items()],
+                default=F(field), output_field=IntegerField()
+            )
+
+        ProductPopularity.objects.filter(product_id__in=totals).update(
+            order_count=bump('order_count', 0),
+            units_sold=bump('units_sold', 1),
+            units_7d=bump('units_7d', 1),
+            units_30d=bump('units_30d', 1),
+        )
+
+
+def reconcile_popularity():
+    """
+    Recompute every counter from the order items, returns the number of products updated
+    Run periodically (e.g. hourly) so the rolling windows drop orders that aged out
+    """
+    now = timezone.now()
+    week_ago = now - timedelta(days=7)
+    month_ago = now - timedelta(days=30)
+
+    totals = {
+        row['product_id']: row
+        for row in OrderItem.objects.filter(product__isnull=False).values('product_id').annotate(
+            orders=Count('id'),
+            units=Sum('quantity'),
+            units_7d=Sum('quantity', filter=Q(order__created_at__gte=week_ago)),
+            units_30d=Sum('quantity', filter=Q(order__created_at__gte=month_ago)),
+        ).order_by()
+    }
+
+    rows = []
+    for product_id in Product.objects.values_list('id', flat=True):
+        row = totals.get(product_id, {})
+        rows.append(ProductPopularity(
+            product_id=product_id,
+            order_count=row.get('orders') or 0,
+            units_sold=row.get('units') or 0,
+            units_7d=row.get('units_7d') or 0,
+            units_30d=row.get('units_30d') or 0,
+            reconciled_at=now,
+        ))
+
+    with transaction.atomic():
+        ProductPopularity.objects.bulk_create(
+            rows,
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['product'],
+            update_fields=['order_count', 'units_sold', 'units_7d', 'units_30d', 'reconciled_at'],
+        )
+
+    logger.info(f"Reconciled popularity counters for {len(rows)} products")
+    return len(rows)
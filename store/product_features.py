@@ -1,48 +1,34 @@
 # product_features.py - Handle product interest tracking, subscriptions, and recommendations
 
-from django.db.models import Count, Q, F
 from django.utils import timezone
-from .models import ProductView, ProductInterest, ProductSubscription, Product
+from .models import ProductSubscription, Product, ProductPopularity
+from .popularity import WINDOW_FIELDS
+from .recommendations import get_recommended_product_ids
+from .search import ordered_by_ids
+from .view_buffer import record_view
 import logging
 
 logger = logging.getLogger(__name__)
 
 def track_product_view(user, product):
-    """Track product view and update user interests per page visit """
+    """
+    Track product view and update user interests per page visit
+    The view is buffered and written in bulk later (see view_buffer.py), so this makes no queries
+    """
     if not user.is_authenticated:
         return
     
-    # Record the view
-    ProductView.objects.create(user=user, product=product)
-    
     # Extract keywords from product
     keywords = product.get_keywords_list()
-
-    if not keywords:
-        keywords = extract_keywords(product)
     
     # If no admin-defined keywords, fall back to extracted keywords
     if not keywords:
         keywords = extract_keywords(product)
     
-    # Update interests for each keyword
-    for keyword in keywords:
-        if not keyword or len(keyword) < 2:
-            continue
-            
-        interest, created = ProductInterest.objects.get_or_create(
-            user=user,
-            keyword=keyword.lower()  # Normalize to lowercase
-        )
-        
-        # Increment view count
-        interest.view_count = F('view_count') + 1
-        interest.save()
-        interest.refresh_from_db()
-        
-        # If viewed 3+ times, this is now an interest
-        if interest.view_count >= 3:
-            logger.info(f"User {user.username} now has interest in '{keyword}'")
+    # Normalize to lowercase, interests are stored per keyword
+    keywords = [keyword.lower()[:100] for keyword in keywords if keyword and len(keyword) >= 2]
+    
+    record_view(user.id, product.id, keywords)
 
 def extract_keywords(product):
     """Extract keywords from product for interest tracking"""
@@ -68,66 +54,36 @@ def extract_keywords(product):
     return keywords
 
 def get_recommended_products(user, limit=100):
-    """Get recommended products based on user interests"""
+    """Get recommended products based on user interests (precomputed, see recommendations.py)"""
     if not user.is_authenticated:
         # Return popular products for anonymous users
         return Product.objects.filter(is_listed=True).order_by('-rating', '-created_at')[:limit]
     
-    # Start with an empty Q object
-    q_objects = Q()
-    
-    # First check explicit interests from User model
-    if user.interest:
-        # Split the interest text field into keywords
-        explicit_interests = [i.strip().lower() for i in user.interest.split(',') if i.strip()]
-        for keyword in explicit_interests:
-            q_objects |= Q(keywords__icontains=keyword)
-    
-    # Then get user's top interests from product views (with 3+ views)
-    viewing_interests = ProductInterest.objects.filter(
-        user=user,
-        view_count__gte=3
-    ).order_by('-view_count')[:5]
-    
-    # Add viewing interests to query
-    for interest in viewing_interests:
-        q_objects |= Q(keywords__icontains=interest.keyword)
-    
-    # If we have any interests (either explicit or from viewing history)
-    if q_objects != Q():
-        # Get recommended products
-        recommended = Product.objects.filter(
-            q_objects,
-            is_listed=True
-        ).exclude(
-            # Exclude products the user already bought
-            id__in=user.orders.filter(status='delivered').values_list('items__product_id', flat=True)
-        ).distinct().order_by('-rating', '-created_at')[:limit]
-    else:
-        # If no interests found, return new releases
-        recommended = Product.objects.filter(is_listed=True).order_by('-created_at')[:limit]
-   
-    # If we still don't have enough products, get some popular ones
-    if recommended.count() < limit:
-        existing_ids = set(recommended.values_list('id', flat=True))
-        popular_products = Product.objects.filter(
-            is_listed=True
-        ).exclude(
-            id__in=existing_ids
-        ).order_by('-rating')[:limit-recommended.count()]
-       
-        # Combine the querysets
-        recommended = list(recommended) + list(popular_products)
-        
-    return recommended
+    product_ids = get_recommended_product_ids(user)[:limit]
+    return ordered_by_ids(Product.objects.filter(is_listed=True), product_ids)
 
-def get_popular_products(limit=8):
-    """Get popular products based on order count"""
-    return Product.objects.filter(
-        is_listed=True
-    ).annotate(
-        order_count=Count('orderitem')
-    ).order_by('-order_count', '-rating')[:limit]
+def get_popular_products(limit=8, window=None):
+    """
+    Get popular products from the maintained order counters (see popularity.py)
+    window can be '7d' or '30d' to rank by recent units sold instead of all-time orders
+    """
+    counter = WINDOW_FIELDS[window]
+    
+    # Top-N read off the counter's index
+    # Equivalent SQL Query:
+    # SELECT pp.product_id FROM store_productpopularity pp JOIN store_product p ON pp.product_id = p.id
+    # WHERE pp.<counter> > 0 AND p.is_listed ORDER BY pp.<counter> DESC, pp.product_id LIMIT %s;
+    product_ids = list(ProductPopularity.objects.filter(
+        **{f'{counter}__gt': 0}, product__is_listed=True
+    ).order_by(f'-{counter}', 'product_id').values_list('product_id', flat=True)[:limit])
+    
+    # Not enough ordered products yet, fill up with the best rated of the rest
+    if len(product_ids) < limit:
+        product_ids += Product.objects.filter(is_listed=True).exclude(
+            id__in=product_ids
+        ).order_by('-rating', '-id').values_list('id', flat=True)[:limit - len(product_ids)]
+    
+    return ordered_by_ids(Product.objects.filter(is_listed=True), product_ids)
 
 def get_new_releases(limit=8):
     """Get new product releases"""
@@ -0,0 +1,66 @@
+# purchases.py - Cached per-user sets of purchased product ids, used for review eligibility
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import OrderItem
+
+# The set is kept up to date at checkout and dropped on cancel/refund, the timeout is a backstop
+PURCHASES_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def _cache_key(user_id):
+    return f"purchased_products_{user_id}"
+
+
+def _load_purchased_product_ids(user_id):
+    """Product ids in the user's orders, leaving out cancelled and refunded ones"""
+    return set(
+        OrderItem.objects.filter(order__user_id=user_id, product__isnull=False)
+                 .exclude(order__status='cancelled')
+                 .exclude(order__payment_info='refunded')
+                 .values_list('product_id', flat=True)
+                 .distinct()
+    )
+
+
+def get_purchased_product_ids(user_id):
+    """Get the set of product ids a user has bought, from the cache when possible"""
+    key = _cache_key(user_id)
+    product_ids = cache.get(key)
+    if product_ids is None:
+        product_ids = _load_purchased_product_ids(user_id)
+        cache.set(key, product_ids, PURCHASES_CACHE_TIMEOUT)
+    return product_ids
+
+
+def add_purchased_products(user_id, product_ids):
+    """Add newly ordered products to a user's cached set once the order is committed"""
+    def add():
+        key = _cache_key(user_id)
+        cached = cache.get(key)
+        # Nothing cached yet, the next read loads the order from the database
+        if cached is not None:
+            cache.set(key, cached | set(product_ids), PURCHASES_CACHE_TIMEOUT)
+
+    transaction.on_commit(add)
+
+
+def invalidate_purchased_products(user_id):
+    """Drop a user's cached set after an order of theirs is cancelled or refunded"""
+    if user_id is not None:
+        transaction.on_commit(lambda: cache.delete(_cache_key(user_id)))
+
+
+def get_review_eligibility(user, product_ids):
+    """
+    Get {product_id: can review} for many products with at most one query
+    Same rules as User.can_review_product
+    """
+    if user.is_review_banned:
+        return {product_id: False for product_id in product_ids}
+    if user.role == 'admin':
+        return {product_id: True for product_id in product_ids}
+
+    purchased = get_purchased_product_ids(user.id)
+    return {product_id: product_id in purchased for product_id in product_ids}
@@ -0,0 +1,96 @@
+# recommendations.py - Precomputed per-user product recommendations
+
+import logging
+
+from django.core.cache import cache
+from .keywords import products_with_keywords
+from .models import OrderItem, Product, ProductInterest, UserRecommendation
+
+logger = logging.getLogger(__name__)
+
+# How many product ids are stored per user
+RECOMMENDATIONS_LIMIT = 100
+
+# How long a user's list stays in the shared cache (the table keeps it after that)
+RECOMMENDATIONS_CACHE_TIMEOUT = 60 * 60 * 6
+
+# Views of a keyword before it counts as an interest, and how many of those are used
+INTEREST_MIN_VIEWS = 3
+MAX_VIEWED_INTERESTS = 5
+
+
+def _cache_key(user_id):
+    return f"recommendations_{user_id}"
+
+
+def get_interest_keywords(user):
+    """Get a user's explicit interests followed by their most viewed keywords"""
+    keywords = []
+    if user.interest:
+        keywords.extend(i.strip().lower() for i in user.interest.split(',') if i.strip())
+
+    keywords.extend(ProductInterest.objects.filter(
+        user=user,
+        view_count__gte=INTEREST_MIN_VIEWS
+    ).order_by('-view_count').values_list('keyword', flat=True)[:MAX_VIEWED_INTERESTS])
+
+    return list(dict.fromkeys(keywords))
+
+
+def compute_recommendations(user, limit=RECOMMENDATIONS_LIMIT):
+    """Rank product ids for a user: interest matches first, then the best rated products"""
+    listed = Product.objects.filter(is_listed=True)
+    keywords = get_interest_keywords(user)
+
+    if keywords:
+        # Skip products the user already received
+        purchased = OrderItem.objects.filter(
+            order__user=user,
+            order__status='delivered',
+            product__isnull=False
+        ).values('product_id')
+
+        product_ids = list(
+            listed.filter(id__in=products_with_keywords(keywords)).exclude(id__in=purchased)
+                  .order_by('-rating', '-created_at').values_list('id', flat=True)[:limit]
+        )
+    else:
+        # No interests yet, start with new releases
+        product_ids = list(listed.order_by('-created_at').values_list('id', flat=True)[:limit])
+
+    if len(product_ids) < limit:
+        product_ids += list(
+            listed.exclude(id__in=product_ids).order_by('-rating')
+                  .values_list('id', flat=True)[:limit - len(product_ids)]
+        )
+
+    return product_ids
+
+
+def refresh_recommendations(user):
+    """Recompute and store a user's recommendations, returns the product ids"""
+    product_ids = compute_recommendations(user)
+    UserRecommendation.objects.update_or_create(user=user, defaults={'product_ids': product_ids})
+    cache.set(_cache_key(user.id), product_ids, RECOMMENDATIONS_CACHE_TIMEOUT)
+    return product_ids
+
+
+def get_recommended_product_ids(user):
+    """Get a user's ranked product ids from the cache, then the table, computing them only if both miss"""
+    key = _cache_key(user.id)
+    product_ids = cache.get(key)
+    if product_ids is not None:
+        return product_ids
+
+    stored = UserRecommendation.objects.filter(user=user).values_list('product_ids', flat=True).first()
+    if stored is None:
+        return refresh_recommendations(user)
+
+    cache.set(key, stored, RECOMMENDATIONS_CACHE_TIMEOUT)
+    return stored
+
+
+def invalidate_recommendations(user_id):
+    """Drop a user's stored list so the next request recomputes it"""
+    UserRecommendation.objects.filter(user_id=user_id).delete()
+    cache.delete(_cache_key(user_id))
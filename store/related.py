@@ -0,0 +1,108 @@
+# related.py - Related products computed offline from TF-IDF cosine similarity
+
+import logging
+import math
+from collections import Counter, defaultdict
+
+from django.db import transaction
+
+from .models import Product, RelatedProduct
+from .search import tokenize
+
+logger = logging.getLogger(__name__)
+
+# How many related products are stored per product
+RELATED_PRODUCTS_COUNT = 8
+
+# Term weights per field before TF-IDF, the name and Pokemon say the most about a product
+FIELD_WEIGHTS = {
+    'name': 3.0,
+    'pokemon': 3.0,
+    'keywords': 2.0,
+    'category': 1.5,
+}
+
+
+def _product_terms(product):
+    """Weighted term counts for a product"""
+    terms = Counter()
+    for term in tokenize(product.name):
+        terms[term] += FIELD_WEIGHTS['name']
+    for term in tokenize(product.keywords or ''):
+        terms[term] += FIELD_WEIGHTS['keywords']
+
+    # Category and Pokemon are matched as a whole, not word by word
+    if product.category_id:
+        terms[f'category:{product.category_id}'] += FIELD_WEIGHTS['category']
+    if product.pokemon:
+        terms[f"pokemon:{' '.join(product.pokemon.lower().split())}"] += FIELD_WEIGHTS['pokemon']
+    return terms
+
+
+def compute_related(products, count=RELATED_PRODUCTS_COUNT):
+    """
+    Compute the most similar products for each product
+    Returns {product_id: [(related_id, score), ...]} with the best match first
+    """
+    terms = {p.id: _product_terms(p) for p in products}
+    if not terms:
+        return {}
+
+    # Inverse document frequency, rare terms matter more
+    doc_freq = Counter(term for product_terms in terms.values() for term in product_terms)
+    idf = {term: math.log(len(terms) / df) + 1 for term, df in doc_freq.items()}
+
+    # Unit-length TF-IDF vectors, so a dot product is the cosine similarity
+    vectors = {}
+    postings = defaultdict(list)
+    for product_id, product_terms in terms.items():
+        # Sublinear term frequency, so a word repeated across fields doesn't drown out the rest
+        vector = {term: (1 + math.log(tf)) * idf[term] for term, tf in product_terms.items()}
+        norm = math.sqrt(sum(w * w for w in vector.values())) or 1
+        vectors[product_id] = {term: w / norm for term, w in vector.items()}
+        for term, w in vectors[product_id].items():
+            postings[term].append((product_id, w))
+
+    # Only products sharing a term can score above zero, so walk the postings instead of every pair
+    related = {}
+    for product_id, vector in vectors.items():
+        scores = defaultdict(float)
+        for term, w in vector.items():
+            for other_id, other_w in postings[term]:
+                if other_id != product_id:
+                    scores[other_id] += w * other_w
+
+        best = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:count]
+        related[product_id] = best
+
+    return related
+
+
+def rebuild_related_products(count=RELATED_PRODUCTS_COUNT):
+    """Recompute the related products table for every listed product, returns the number of rows"""
+    products = list(
+        Product.objects.filter(is_listed=True).only('id', 'name', 'keywords', 'category_id', 'pokemon')
+    )
+    related = compute_related(products, count)
+
+    rows = [
+        RelatedProduct(product_id=product_id, related_product_id=related_id, rank=rank, score=score)
+        for product_id, matches in related.items()
+        for rank, (related_id, score) in enumerate(matches)
+    ]
+
+    with transaction.atomic():
+        RelatedProduct.objects.all().delete()
+        RelatedProduct.objects.bulk_create(rows, batch_size=1000)
+
+    logger.info(f"Stored {len(rows)} related products for {len(related)} products")
+    return len(rows)
+
+
+def get_related_products(product_id, limit=4):
+    """Get the precomputed related products for a product that are still listed, best match first"""
+    entries = RelatedProduct.objects.filter(
+        product_id=product_id,
+        related_product__is_listed=True,
+    ).select_related('related_product__category', 'related_product__user').order_by('rank')[:limit]
+    return [entry.related_product for entry in entries]
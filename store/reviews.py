@@ -0,0 +1,194 @@
+# reviews.py - Review aggregates on Product, updated with atomic deltas instead of re-averaging,
+# and keyset paginated review listings
+
+import base64
+import binascii
+import json
+import logging
+from datetime import datetime
+
+from django.db import transaction
+from django.db.models import Count, F, FloatField, Q, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+from .models import Product, Review
+from . import signals
+
+logger = logging.getLogger(__name__)
+
+STARS = (5, 4, 3, 2, 1)
+
+# Reviews per page on the product page and the reviews API
+REVIEW_PAGE_SIZE = 10
+REVIEW_MAX_PAGE_SIZE = 50
+
+# Sort name -> (field, descending) keys, each ends in id so the order is total
+REVIEW_SORTS = {
+    'newest': (('created_at', True), ('id', True)),
+    'oldest': (('created_at', False), ('id', False)),
+    'highest': (('rating', True), ('created_at', True), ('id', True)),
+    'lowest': (('rating', False), ('created_at', True), ('id', True)),
+}
+DEFAULT_REVIEW_SORT = 'newest'
+
+
+def _star_field(star):
+    return f"rating_{star}_count"
+
+
+def _apply_delta(product_id, count_delta, sum_delta, star_deltas):
+    """
+    Shift a product's review_count / rating_sum / star histogram and recompute its rating in one UPDATE
+    Only the aggregate columns are written, so it can't overwrite concurrent edits to other fields
+    """
+    new_count = F('review_count') + count_delta
+    new_sum = F('rating_sum') + sum_delta
+    stars = {_star_field(star): F(_star_field(star)) + delta for star, delta in star_deltas.items() if delta}
+
+    Product.objects.filter(id=product_id).update(
+        review_count=new_count,
+        rating_sum=new_sum,
+        # No reviews left means no rating, as before
+        rating=Coalesce(Cast(new_sum, FloatField()) / NullIf(new_count, Value(0)), Value(0.0)),
+        **stars,
+    )
+    transaction.on_commit(lambda: signals.product_data_changed([product_id]))
+
+
+def review_added(review):
+    """Count a new review (call inside the transaction that created it)"""
+    _apply_delta(review.product_id, 1, review.rating, {review.rating: 1})
+
+
+def review_rating_changed(review, old_rating):
+    """Move a review's stars from old_rating to review.rating"""
+    if review.rating != old_rating:
+        _apply_delta(review.product_id, 0, review.rating - old_rating, {review.rating: 1, old_rating: -1})
+
+
+def review_removed(review):
+    """Stop counting a deleted review (call inside the transaction that deleted it)"""
+    _apply_delta(review.product_id, -1, -review.rating, {review.rating: -1})
+
+
+def delete_review(review):
+    """
+    Delete a review and stop counting it, returns False if it was already gone
+    The row is locked and re-read first, so the delta uses its current rating, and only a delete
+    that actually removed the row is counted (two concurrent deletes only count once)
+    """
+    with transaction.atomic():
+        current = Review.objects.select_for_update().filter(id=review.id).first()
+        if current is None:
+            return False
+        deleted, _ = current.delete()
+        if deleted:
+            review_removed(current)
+        return bool(deleted)
+
+
+def get_rating_histogram(product):
+    """Get {stars: review count} for a product from its histogram columns, 5 stars first"""
+    return {star: getattr(product, _star_field(star)) for star in STARS}
+
+
+# --- Review pages ---
+
+def encode_review_cursor(sort, review):
+    """Build the opaque cursor pointing just after review in the given sort"""
+    values = []
+    for field, _ in REVIEW_SORTS[sort]:
+        value = getattr(review, field)
+        values.append(value.isoformat() if isinstance(value, datetime) else value)
+    return base64.urlsafe_b64encode(json.dumps([sort, values]).encode()).decode()
+
+
+def decode_review_cursor(sort, cursor):
+    """Read the sort key values out of a cursor, raising ValueError if it is not one of ours"""
+    try:
+        cursor_sort, values = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        keys = REVIEW_SORTS[sort]
+        if cursor_sort != sort or len(values) != len(keys):
+            raise ValueError
+        return [
+            datetime.fromisoformat(value) if field == 'created_at' else int(value)
+            for (field, _), value in zip(keys, values)
+        ]
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+        raise ValueError('Invalid cursor')
+
+
+def _after(keys, values):
+    """Filter for rows that come after values in the (field, descending) order of keys"""
+    condition = Q()
+    equal = Q()
+    for (field, descending), value in zip(keys, values):
+        condition |= equal & Q(**{f"{field}__{'lt' if descending else 'gt'}": value})
+        equal &= Q(**{field: value})
+    return condition
+
+
+def get_review_page(product, sort=DEFAULT_REVIEW_SORT, cursor=None, limit=REVIEW_PAGE_SIZE, rating=None):
+    """
+    Get one page of a product's reviews as (reviews, next_cursor)
+    Pages continue from the last row's sort key instead of an offset, so deep pages
+    cost the same as the first one on the (product, ..., created_at, id) indexes
+    """
+    if sort not in REVIEW_SORTS:
+        raise ValueError(f"Unknown sort: {sort}")
+    keys = REVIEW_SORTS[sort]
+
+    reviews = Review.objects.filter(product=product)
+    if rating is not None:
+        reviews = reviews.filter(rating=rating)
+    if cursor:
+        reviews = reviews.filter(_after(keys, decode_review_cursor(sort, cursor)))
+
+    ordering = [f"-{field}" if descending else field for field, descending in keys]
+    # Fetch one extra row to know whether there is another page
+    page = list(reviews.select_related('user').order_by(*ordering)[:limit + 1])
+    has_more = len(page) > limit
+    page = page[:limit]
+
+    for review in page:
+        # Already loaded, saves a query per review in to_json
+        review.product = product
+
+    next_cursor = encode_review_cursor(sort, page[-1]) if has_more else None
+    return page, next_cursor
+
+
+def reconcile_review_aggregates():
+    """
+    Recompute review_count, rating_sum, the star histogram and rating from the reviews
+    for every product that has drifted, returns the number of products fixed
+    """
+    histograms = {}
+    for row in Review.objects.values('product_id', 'rating').annotate(count=Count('id')).order_by():
+        histograms.setdefault(row['product_id'], {})[row['rating']] = row['count']
+
+    star_fields = [_star_field(star) for star in STARS]
+    fixed = []
+    for product in Product.objects.only('id', 'review_count', 'rating_sum', 'rating', *star_fields):
+        histogram = histograms.get(product.id, {})
+        count = sum(histogram.values())
+        total = sum(star * n for star, n in histogram.items())
+        stars = {_star_field(star): histogram.get(star, 0) for star in STARS}
+
+        current = {field: getattr(product, field) for field in star_fields}
+        if (product.review_count, product.rating_sum, current) == (count, total, stars):
+            continue
+
+        product.review_count = count
+        product.rating_sum = total
+        product.rating = total / count if count else 0
+        for field, value in stars.items():
+            setattr(product, field, value)
+        fixed.append(product)
+
+    if fixed:
+        Product.objects.bulk_update(fixed, ['review_count', 'rating_sum', 'rating', *star_fields], batch_size=500)
+        signals.product_data_changed([product.id for product in fixed])
+
+    logger.info(f"Reconciled review aggregates, fixed {len(fixed)} products")
+    return len(fixed)
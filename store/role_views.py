@@ -3,10 +3,14 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST
-from django.db.models import Count, Q, Avg
+from django.db.models import Count, Q
 from django.utils import timezone
+from django.db import transaction
 from .models import User, Product, Order, OrderItem, Review, Notification, Message, Conversation
 from .permissions import admin_required
+from .reviews import delete_review
+from .purchases import invalidate_purchased_products
+from .inventory import release_stock
 from .auth_middleware import RoleMiddleware
 import logging
 from decimal import Decimal
@@ -347,17 +351,9 @@ def delete_review_by_moderator(request):
         # Record the review details for notifications before deleting
         product_name = product.name
         
-        # Delete the review
-        review.delete()
-        
-        # Update product rating
-        avg_rating = Review.objects.filter(product=product).aggregate(Avg('rating'))['rating__avg']
-        if avg_rating:
-            product.rating = avg_rating
-        else:
-            # If no reviews left, set rating to 0
-            product.rating = 0
-        product.save()
+        # Delete the review and take it out of the product's rating
+        if not delete_review(review):
+            return JsonResponse({'success': False, 'error': 'Review not found'}, status=404)
         
         # Create notification for the review author
         Notification.create_notification(
@@ -420,14 +416,18 @@ def cancel_order(request):
         if order.status in ['cancelled']:
             return JsonResponse({'success': False, 'error': 'Cannot cancel this order'}, status=400)
         
-        order.status = 'cancelled'
-        order.save()
-        
-        # Restore product quantities
-        for item in order.items.all():
-            if item.product:
-                item.product.quantity += item.quantity
-                item.product.save()
+        with transaction.atomic():
+            # Only one request can flip the status, so stock is put back once
+            cancelled = Order.objects.filter(id=order.id).exclude(status='cancelled').update(
+                status='cancelled', updated_at=timezone.now()
+            )
+            if not cancelled:
+                return JsonResponse({'success': False, 'error': 'Cannot cancel this order'}, status=400)
+            order.status = 'cancelled'
+            invalidate_purchased_products(order.user_id)
+            
+            # Restore product quantities
+            release_stock(order.items.filter(product__isnull=False).values_list('product_id', 'quantity'))
         
         # Notify user
         Notification.create_notification(
@@ -459,6 +459,7 @@ def refund_order(request):
         
         order.payment_info = 'refunded'
         order.save()
+        invalidate_purchased_products(order.user_id)
         
         # Notify user
         Notification.create_notification(
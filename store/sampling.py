@@ -0,0 +1,83 @@
+# sampling.py - Random rows without loading the whole table
+
+import logging
+import random
+
+from django.core.cache import cache
+from django.db.models import Max, Min
+
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+# How long the id range is cached, products added since then are only sampled once it expires
+BOUNDS_CACHE_TIMEOUT = 600
+
+# Random draws per wanted row before giving up (draws can land on excluded or already picked rows)
+ATTEMPTS_PER_ROW = 3
+
+
+class RandomSampler:
+    """
+    Samples random rows by id range: pick a random id between the smallest and
+    largest id and take the first row at or after it, using the primary key index.
+    Memory and query cost depend only on the sample size, not on the table size.
+
+    Rows that follow a gap in the ids are a bit more likely to be picked, which
+    is fine for "discover" style widgets.
+    """
+
+    def __init__(self, get_queryset, cache_key):
+        self.get_queryset = get_queryset
+        self.cache_key = cache_key
+
+    def _bounds(self):
+        bounds = cache.get(self.cache_key)
+        if bounds is None:
+            bounds = self.get_queryset().aggregate(low=Min('id'), high=Max('id'))
+            cache.set(self.cache_key, bounds, BOUNDS_CACHE_TIMEOUT)
+        return bounds['low'], bounds['high']
+
+    def sample_ids(self, count, exclude=()):
+        """Get up to count distinct random ids, skipping the ids in exclude"""
+        low, high = self._bounds()
+        if low is None or count <= 0:
+            return []
+
+        excluded = set(exclude)
+        picked = []
+        for _ in range(count * ATTEMPTS_PER_ROW):
+            if len(picked) >= count:
+                break
+
+            start = random.randint(low, high)
+            candidates = self.get_queryset().exclude(id__in=excluded).order_by('id').values_list('id', flat=True)
+            # Wrap around to the start when nothing is left after the random id
+            row_id = candidates.filter(id__gte=start).first() or candidates.filter(id__lt=start).first()
+            if row_id is None:
+                break
+
+            picked.append(row_id)
+            excluded.add(row_id)
+
+        return picked
+
+    def sample(self, count, exclude=(), queryset=None):
+        """
+        Get up to count random rows in random order
+        queryset can add select_related etc. for the final fetch
+        """
+        ids = self.sample_ids(count, exclude)
+        if not ids:
+            return []
+
+        if queryset is None:
+            queryset = self.get_queryset()
+        rows = queryset.in_bulk(ids)
+        return [rows[row_id] for row_id in ids if row_id in rows]
+
+
+listed_product_sampler = RandomSampler(
+    lambda: Product.objects.filter(is_listed=True),
+    'random_sampler_listed_products_bounds',
+)
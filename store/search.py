@@ -0,0 +1,559 @@
+# search.py - In-memory product search indexes, kept up to date from Product signals
+
+import hashlib
+import heapq
+import json
+import logging
+import math
+import re
+import threading
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, IntegerField, Q, When
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# Bumped on every product change so other worker processes know their copy is stale
+# (only reaches them if the default cache is shared, see CACHES in settings.py)
+GENERATION_KEY = 'search_index_generation'
+
+# Namespace for cached search results, bumped from signals.py when products or categories change
+RESULTS_VERSION_KEY = 'search_results_version'
+
+WORD_RE = re.compile(r'[a-z0-9]+')
+
+STOP_WORDS = {
+    'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by',
+    'is', 'it', 'this', 'that', 'your', 'you', 'our', 'from', 'as', 'are', 'be',
+}
+
+# Name matches count the most, then admin keywords, then the long-form text
+FIELD_WEIGHTS = {
+    'name': 3.0,
+    'keywords': 2.0,
+    'feature': 1.0,
+    'description': 1.0,
+}
+
+# Cap on how many vocabulary terms a half-typed word may expand to
+MAX_PREFIX_EXPANSIONS = 50
+
+# Lowest trigram similarity (Jaccard) for a name to count as a "did you mean" suggestion
+MIN_NAME_SIMILARITY = 0.2
+
+# Cap on how many prefix matches autocomplete looks at before ranking
+MAX_COMPLETION_SCAN = 200
+
+
+def split_words(text):
+    """Lowercase text and split it into alphanumeric words"""
+    if not text:
+        return []
+    return WORD_RE.findall(text.lower())
+
+
+def stem(word):
+    """
+    Light suffix stripping so plurals and simple verb forms share a term
+    (e.g. "hoodies" and "hoodie" -> "hoodi", "printed" -> "print")
+    """
+    if len(word) <= 3:
+        return word
+
+    if word.endswith('sses'):
+        word = word[:-2]
+    elif word.endswith('ies'):
+        word = word[:-3] + 'i'
+    elif word.endswith('s') and not word.endswith(('ss', 'us', 'is')):
+        word = word[:-1]
+    elif word.endswith('ing') and len(word) > 5:
+        word = word[:-3]
+    elif word.endswith('ed') and len(word) > 4:
+        word = word[:-2]
+
+    if len(word) > 3 and word.endswith('y'):
+        word = word[:-1] + 'i'
+    elif len(word) > 4 and word.endswith('e'):
+        word = word[:-1]
+    return word
+
+
+def tokenize(text):
+    """Split text into stemmed terms, dropping stop words"""
+    return [stem(word) for word in split_words(text) if word not in STOP_WORDS]
+
+
+def trigrams(text):
+    """
+    Get the set of 3-character slices of each word, padded like pg_trgm
+    so word starts and ends carry more weight (e.g. "cap" -> "  c", " ca", "cap", "ap ")
+    """
+    grams = set()
+    for word in split_words(text):
+        padded = f"  {word} "
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return grams
+
+
+class ProductIndex(ABC):
+    """
+    Base class for an in-memory index over listed products.
+
+    The index is built lazily from the database on first use and then updated
+    incrementally by the Product signals in signals.py. Each process keeps its own
+    copy and a generation counter in the default cache tells a process when another
+    one has changed a product and its copy needs a rebuild. That only works across
+    processes with a shared cache backend (Redis, Memcached, database); with the
+    per-process LocMemCache a process only sees its own product changes.
+    """
+    fields = ('id', 'name')
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._built = False
+        self._generation = None
+
+    @abstractmethod
+    def clear(self):
+        """Empty the index"""
+
+    @abstractmethod
+    def add(self, row):
+        """Index a product from a row of its values for self.fields"""
+
+    @abstractmethod
+    def remove(self, product_id):
+        """Take a product out of the index, if it is in it"""
+
+    def ensure_built(self):
+        """Build the index if it is empty or another process has changed products"""
+        generation = cache.get(GENERATION_KEY, 0)
+        with self._lock:
+            if self._built and self._generation == generation:
+                return
+
+            from .models import Product
+            rows = Product.objects.filter(is_listed=True).values(*self.fields)
+
+            self.clear()
+            count = 0
+            for row in rows.iterator():
+                self.add(row)
+                count += 1
+
+            self._built = True
+            self._generation = generation
+            logger.info(f"Built {self.__class__.__name__} with {count} products")
+
+    def apply_change(self, product_id, row, generation):
+        """Apply a single product change (row is None when it should leave the index)"""
+        with self._lock:
+            if not self._built:
+                # Nothing to patch, the next search builds from the database
+                return
+
+            self.remove(product_id)
+            if row is not None:
+                self.add(row)
+
+            # Only advance if no other process slipped a change in between,
+            # otherwise leave the generation stale so the next search rebuilds
+            if self._generation is not None and generation == self._generation + 1:
+                self._generation = generation
+
+
+class FullTextIndex(ProductIndex):
+    """Inverted index over name/description/keywords/feature with BM25 ranking"""
+    fields = ('id', 'name', 'description', 'keywords', 'feature')
+
+    # Standard BM25 parameters
+    k1 = 1.2
+    b = 0.75
+
+    def clear(self):
+        self._postings = defaultdict(dict)  # term -> {product_id: weighted term frequency}
+        self._doc_terms = {}  # product_id -> terms, so a product can be removed
+        self._doc_lengths = {}
+        self._total_length = 0.0
+        self._vocabulary = None  # sorted terms for prefix lookups, rebuilt lazily
+
+    def add(self, row):
+        frequencies = Counter()
+        for field, weight in FIELD_WEIGHTS.items():
+            for term in tokenize(row.get(field)):
+                frequencies[term] += weight
+
+        product_id = row['id']
+        for term, frequency in frequencies.items():
+            self._postings[term][product_id] = frequency
+
+        length = sum(frequencies.values())
+        self._doc_terms[product_id] = tuple(frequencies)
+        self._doc_lengths[product_id] = length
+        self._total_length += length
+        self._vocabulary = None
+
+    def remove(self, product_id):
+        terms = self._doc_terms.pop(product_id, None)
+        if terms is None:
+            return
+
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(product_id, None)
+                if not postings:
+                    del self._postings[term]
+
+        self._total_length -= self._doc_lengths.pop(product_id)
+        self._vocabulary = None
+
+    def _prefix_terms(self, prefix):
+        """Get the indexed terms starting with prefix"""
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self._postings)
+
+        terms = []
+        position = bisect_left(self._vocabulary, prefix)
+        while position < len(self._vocabulary) and len(terms) < MAX_PREFIX_EXPANSIONS:
+            term = self._vocabulary[position]
+            if not term.startswith(prefix):
+                break
+            terms.append(term)
+            position += 1
+        return terms
+
+    def search(self, query, limit=None):
+        """Return product ids matching query, best match first"""
+        self.ensure_built()
+
+        words = [word for word in split_words(query) if word not in STOP_WORDS]
+        if not words:
+            return []
+
+        with self._lock:
+            doc_count = len(self._doc_lengths)
+            if not doc_count:
+                return []
+            avg_length = self._total_length / doc_count
+
+            # Each query word is a group of alternative terms; the last word may still
+            # be half-typed (search-as-you-type), so it also matches as a prefix
+            groups = [{stem(word)} for word in words]
+            if len(words[-1]) >= 2:
+                groups[-1].update(self._prefix_terms(words[-1]))
+
+            scores = defaultdict(float)
+            for terms in groups:
+                group_scores = {}
+                for term in terms:
+                    postings = self._postings.get(term)
+                    if not postings:
+                        continue
+
+                    doc_freq = len(postings)
+                    idf = math.log(1 + (doc_count - doc_freq + 0.5) / (doc_freq + 0.5))
+                    for product_id, frequency in postings.items():
+                        norm = self.k1 * (1 - self.b + self.b * self._doc_lengths[product_id] / avg_length)
+                        score = idf * frequency * (self.k1 + 1) / (frequency + norm)
+                        # Take the best alternative so prefix expansions don't stack up
+                        if score > group_scores.get(product_id, 0.0):
+                            group_scores[product_id] = score
+
+                for product_id, score in group_scores.items():
+                    scores[product_id] += score
+
+        if limit is None:
+            ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        else:
+            ranked = heapq.nsmallest(limit, scores.items(), key=lambda item: (-item[1], item[0]))
+        return [product_id for product_id, _ in ranked]
+
+
+class TrigramIndex(ProductIndex):
+    """Trigram index over product names for typo-tolerant "did you mean" suggestions"""
+    fields = ('id', 'name')
+
+    def clear(self):
+        self._postings = defaultdict(set)  # trigram -> product ids
+        self._names = {}  # product_id -> (lowercased name, trigrams)
+
+    def add(self, row):
+        name = (row.get('name') or '').lower()
+        grams = trigrams(name)
+
+        product_id = row['id']
+        for gram in grams:
+            self._postings[gram].add(product_id)
+        self._names[product_id] = (name, grams)
+
+    def remove(self, product_id):
+        entry = self._names.pop(product_id, None)
+        if entry is None:
+            return
+
+        for gram in entry[1]:
+            postings = self._postings.get(gram)
+            if postings is not None:
+                postings.discard(product_id)
+                if not postings:
+                    del self._postings[gram]
+
+    def similar(self, query, limit=8):
+        """
+        Return ids of the products whose names look most like query.
+        Names starting with the query come first, then by trigram similarity.
+        """
+        self.ensure_built()
+
+        query = query.lower().strip()
+        query_grams = trigrams(query)
+        if not query_grams:
+            return []
+
+        with self._lock:
+            # Count shared trigrams, touching only products that share at least one
+            overlaps = Counter()
+            for gram in query_grams:
+                overlaps.update(self._postings.get(gram, ()))
+
+            candidates = []
+            for product_id, overlap in overlaps.items():
+                name, grams = self._names[product_id]
+                similarity = overlap / (len(query_grams) + len(grams) - overlap)
+                if similarity >= MIN_NAME_SIMILARITY:
+                    candidates.append((not name.startswith(query), -similarity, name, product_id))
+
+        return [candidate[-1] for candidate in heapq.nsmallest(limit, candidates)]
+
+
+class CompletionIndex(ProductIndex):
+    """
+    Sorted array of product names, keywords and category names for search-as-you-type.
+    Every word start of a phrase is a key, so "hood" completes "Wildcat Hoodie".
+    """
+    fields = ('id', 'name', 'keywords', 'category__name')
+
+    def clear(self):
+        self._phrases = {}  # (type, lowercased phrase) -> {'text': display text, 'product_ids': set}
+        self._product_phrases = {}  # product_id -> phrase keys, so a product can be removed
+        self._entries = None  # sorted (prefix key, phrase key) pairs, rebuilt lazily
+
+    def _row_phrases(self, row):
+        """Get the (type, display text) phrases a product contributes"""
+        phrases = [('product', row.get('name') or '')]
+        if row.get('category__name'):
+            phrases.append(('category', row['category__name']))
+        if row.get('keywords'):
+            phrases.extend(('keyword', k.strip()) for k in row['keywords'].split(','))
+        return [(kind, ' '.join(text.split())) for kind, text in phrases if text.strip()]
+
+    def add(self, row):
+        product_id = row['id']
+        keys = []
+        for kind, text in self._row_phrases(row):
+            key = (kind, text.lower())
+            phrase = self._phrases.setdefault(key, {'text': text, 'product_ids': set()})
+            phrase['product_ids'].add(product_id)
+            keys.append(key)
+
+        self._product_phrases[product_id] = keys
+        self._entries = None
+
+    def remove(self, product_id):
+        keys = self._product_phrases.pop(product_id, None)
+        if keys is None:
+            return
+
+        for key in keys:
+            phrase = self._phrases.get(key)
+            if phrase is not None:
+                phrase['product_ids'].discard(product_id)
+                if not phrase['product_ids']:
+                    del self._phrases[key]
+        self._entries = None
+
+    def _sorted_entries(self):
+        if self._entries is None:
+            entries = []
+            for key in self._phrases:
+                words = key[1].split()
+                for i in range(len(words)):
+                    entries.append((' '.join(words[i:]), key))
+            entries.sort()
+            self._entries = entries
+        return self._entries
+
+    def complete(self, prefix, limit=8):
+        """
+        Return completions for prefix as dicts with text, type and (for products) product_id.
+        Phrases that start with the prefix come first, then the ones used by most products.
+        """
+        self.ensure_built()
+
+        prefix = ' '.join(prefix.lower().split())
+        if not prefix:
+            return []
+
+        with self._lock:
+            entries = self._sorted_entries()
+            matches = {}
+            position = bisect_left(entries, (prefix,))
+            scanned = 0
+            while position < len(entries) and scanned < MAX_COMPLETION_SCAN:
+                entry_key, phrase_key = entries[position]
+                if not entry_key.startswith(prefix):
+                    break
+                starts_phrase = entry_key == phrase_key[1]
+                matches[phrase_key] = matches.get(phrase_key, False) or starts_phrase
+                position += 1
+                scanned += 1
+
+            ranked = heapq.nsmallest(limit, matches.items(), key=lambda item: (
+                not item[1],
+                -len(self._phrases[item[0]]['product_ids']),
+                item[0][1],
+            ))
+
+            completions = []
+            for phrase_key, _ in ranked:
+                phrase = self._phrases[phrase_key]
+                completion = {'text': phrase['text'], 'type': phrase_key[0]}
+                if phrase_key[0] == 'product':
+                    completion['product_id'] = min(phrase['product_ids'])
+                completions.append(completion)
+        return completions
+
+
+full_text_index = FullTextIndex()
+trigram_index = TrigramIndex()
+completion_index = CompletionIndex()
+
+# Every index that should follow product changes
+INDEXES = [full_text_index, trigram_index, completion_index]
+
+
+def _bump_counter(key):
+    """Advance a shared counter in the cache and return the new value"""
+    cache.add(key, 0, None)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Key was evicted between add and incr
+        cache.set(key, 1, None)
+        return 1
+
+
+def _bump_generation():
+    """Advance the index generation and return the new value"""
+    return _bump_counter(GENERATION_KEY)
+
+
+def product_changed(product):
+    """Update the indexes after a product was saved"""
+    generation = _bump_generation()
+    row = None
+    if product.is_listed:
+        row = {
+            'id': product.id,
+            'name': product.name,
+            'description': product.description,
+            'keywords': product.keywords,
+            'feature': product.feature,
+            'category__name': product.category.name,
+        }
+    for index in INDEXES:
+        index.apply_change(product.id, row, generation)
+
+
+def product_removed(product_id):
+    """Drop a deleted product from the indexes"""
+    generation = _bump_generation()
+    for index in INDEXES:
+        index.apply_change(product_id, None, generation)
+
+
+def categories_changed():
+    """
+    A category was renamed or deleted, which touches many products at once,
+    so just mark every index stale and let the next search rebuild it
+    """
+    _bump_generation()
+
+
+# --- Result cache ---
+
+def search_results_key(query, category, min_price, max_price, min_rating):
+    """Build the result cache key for a normalized search in the current namespace"""
+    version = cache.get(RESULTS_VERSION_KEY, 0)
+    params = json.dumps([
+        ' '.join((query or '').lower().split()),
+        category or '',
+        float(min_price) if min_price is not None else None,
+        float(max_price) if max_price is not None else None,
+        float(min_rating) if min_rating is not None else None,
+    ])
+    return f"search_results_{version}_{hashlib.md5(params.encode()).hexdigest()}"
+
+
+def invalidate_search_results():
+    """Move cached search results to a fresh namespace (old entries just expire)"""
+    _bump_counter(RESULTS_VERSION_KEY)
+
+
+def ordered_by_ids(queryset, product_ids):
+    """Filter queryset to product_ids, keeping the order of the list"""
+    if not product_ids:
+        return queryset.none()
+
+    ranking = Case(
+        *[When(id=product_id, then=position) for position, product_id in enumerate(product_ids)],
+        output_field=IntegerField()
+    )
+    return queryset.filter(id__in=product_ids).order_by(ranking)
+
+
+# --- Search backends ---
+
+class DatabaseSearchBackend:
+    """Plain substring matching in the database (no ranking), plus exact keyword matches"""
+    ranked = False
+
+    def filter_queryset(self, queryset, query):
+        from .keywords import products_with_keywords
+
+        return queryset.filter(
+            Q(name__icontains=query) |
+            Q(description__icontains=query) |
+            Q(id__in=products_with_keywords([query]))
+        )
+
+
+class InvertedIndexBackend:
+    """Ranked matching through the in-memory full-text index"""
+    ranked = True
+
+    def filter_queryset(self, queryset, query):
+        limit = getattr(settings, 'SEARCH_MAX_RESULTS', 500)
+        product_ids = full_text_index.search(query, limit=limit)
+
+        # Keep the BM25 order when the rows come back from the database
+        return ordered_by_ids(queryset, product_ids)
+
+
+_backend = None
+
+
+def get_search_backend():
+    """Get the backend configured by settings.SEARCH_BACKEND"""
+    global _backend
+    if _backend is None:
+        backend_path = getattr(settings, 'SEARCH_BACKEND', 'store.search.InvertedIndexBackend')
+        _backend = import_string(backend_path)()
+    return _backend
@@ -1,19 +1,52 @@
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
+from django.contrib.auth.signals import user_logged_in
 from django.core.cache import cache
-from .models import Product, Category
+from .models import Product, Category, User, Cart
+from . import search
+from .recommendations import invalidate_recommendations
+from .cart_store import SessionCart
+
+def product_data_changed(product_ids):
+    """Clear what invalidate_product_cache would have, for products changed with update() (which skips post_save)"""
+    cache.delete_many([f'product_detail_{product_id}' for product_id in product_ids])
+    search.invalidate_search_results()
 
 @receiver(post_save, sender=Product)
 def invalidate_product_cache(sender, instance, **kwargs):
     """Invalidate product cache when a product is updated"""
     cache.delete(f'product_detail_{instance.id}')
+    search.product_changed(instance)
+    search.invalidate_search_results()
 
 @receiver(post_delete, sender=Product)
 def invalidate_product_cache_on_delete(sender, instance, **kwargs):
     """Invalidate product cache when a product is deleted"""
     cache.delete(f'product_detail_{instance.id}')
+    search.product_removed(instance.id)
+    search.invalidate_search_results()
 
 @receiver([post_save, post_delete], sender=Category)
 def invalidate_categories_cache(sender, instance, **kwargs):
     """Invalidate categories cache when a category is updated or deleted"""
-    cache.delete('all_categories')
\ No newline at end of file
+    cache.delete('all_categories')
+    search.categories_changed()
+    search.invalidate_search_results()
+
+@receiver(pre_save, sender=User)
+def invalidate_recommendations_on_interest_change(sender, instance, update_fields=None, **kwargs):
+    """Drop stored recommendations when a user's explicit interests change"""
+    if instance.pk is None or (update_fields is not None and 'interest' not in update_fields):
+        return
+    old_interest = User.objects.filter(pk=instance.pk).values_list('interest', flat=True).first()
+    if old_interest != instance.interest:
+        invalidate_recommendations(instance.pk)
+
+@receiver(user_logged_in)
+def merge_session_cart_on_login(sender, request, user, **kwargs):
+    """Move the cart a visitor built before logging in into their user cart"""
+    if request is None:
+        return
+    session_cart = SessionCart(request)
+    if session_cart.items:
+        session_cart.merge_into(Cart.get_or_create_cart(user=user, session_id=request.session.session_key))
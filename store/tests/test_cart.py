@@ -0,0 +1,67 @@
+import json
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from store.models import Cart, CartItem, Category, Order, Product, User
+
+
+class SessionCartTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Apparel')
+        cls.product = Product.objects.create(
+            name='Cap', description='A cap', price=Decimal('10.00'), category=category, quantity=5
+        )
+        cls.user = User.objects.create_user('buyer', 'buyer@example.com', 'pw')
+
+    def add(self, quantity):
+        return self.client.post('/api/cart/add/', json.dumps({
+            'product_id': self.product.id, 'quantity': quantity
+        }), content_type='application/json').json()
+
+    def checkout(self):
+        return self.client.post('/api/checkout/', json.dumps({
+            'full_name': 'Buyer', 'email': 'buyer@example.com', 'shipping_address': 'Somewhere', 'payment_method': 'cod'
+        }), content_type='application/json').json()
+
+    def test_anonymous_cart_writes_no_cart_rows(self):
+        self.assertTrue(self.add(2)['success'])
+        self.assertTrue(self.add(1)['success'])
+
+        data = self.client.get('/api/cart/').json()
+        self.assertEqual([(item['product_id'], item['quantity']) for item in data['items']], [(self.product.id, 3)])
+        self.assertFalse(Cart.objects.exists())
+
+    def test_anonymous_cart_survives_cache_eviction(self):
+        self.add(2)
+        cache.clear()
+
+        items = self.client.get('/api/cart/').json()['items']
+        self.assertEqual([item['quantity'] for item in items], [2])
+
+    def test_login_merges_the_session_cart(self):
+        self.add(2)
+        self.client.login(username='buyer', password='pw')
+
+        cart = Cart.objects.get(user=self.user)
+        self.assertEqual(list(cart.items.values_list('product_id', 'quantity')), [(self.product.id, 2)])
+        self.assertEqual(self.client.get('/api/cart/').json()['items'][0]['quantity'], 2)
+
+    def test_anonymous_checkout_leaves_no_temporary_cart(self):
+        self.add(2)
+
+        self.assertTrue(self.checkout()['success'])
+        self.assertEqual(Order.objects.get().items.get().quantity, 2)
+        self.assertFalse(Cart.objects.exists())
+        self.assertFalse(CartItem.objects.exists())
+        self.assertEqual(self.client.get('/api/cart/').json()['items'], [])
+
+    def test_failed_anonymous_checkout_rolls_back_the_temporary_cart(self):
+        self.add(2)
+        Product.objects.filter(id=self.product.id).update(quantity=1)
+
+        self.assertFalse(self.checkout()['success'])
+        self.assertFalse(Cart.objects.exists())
+        self.assertEqual(len(self.client.get('/api/cart/').json()['items']), 1)
@@ -0,0 +1,64 @@
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from store import search
+from store.facets import get_search_facets
+from store.models import Category, Product
+
+
+class SearchFacetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        apparel = Category.objects.create(name='Apparel')
+        headwear = Category.objects.create(name='Headwear')
+        for name, price, rating, category in [
+            ('Wildcat Shirt', '24.99', 4.5, apparel),
+            ('Wildcat Hoodie', '49.99', 3.0, apparel),
+            ('Wildcat Jacket', '120.00', 4.0, apparel),
+            ('Wildcat Cap', '25.00', 2.0, headwear),
+        ]:
+            Product.objects.create(
+                name=name, description='Team gear', price=Decimal(price), rating=rating,
+                category=category, quantity=5
+            )
+
+    def setUp(self):
+        cache.clear()
+        for index in search.INDEXES:
+            index._built = False
+
+    def counts(self, facets, facet):
+        return [bucket['count'] for bucket in facets[facet]]
+
+    def test_counts_without_filters(self):
+        facets = get_search_facets('wildcat')
+
+        self.assertEqual(facets['total'], 4)
+        self.assertEqual(facets['categories'], [{'name': 'Apparel', 'count': 3}, {'name': 'Headwear', 'count': 1}])
+        # Bounds are inclusive, 24.99 is under $25 and 25.00 is not
+        self.assertEqual(self.counts(facets, 'price'), [1, 2, 0, 1])
+        self.assertEqual(self.counts(facets, 'rating'), [2, 3, 4, 4])
+
+    def test_each_facet_ignores_its_own_filter(self):
+        facets = get_search_facets('wildcat', category='Apparel', max_price=49.99)
+
+        # Categories follow the price filter, prices follow the category but not the price filter
+        self.assertEqual(facets['categories'], [{'name': 'Apparel', 'count': 2}, {'name': 'Headwear', 'count': 1}])
+        self.assertEqual(self.counts(facets, 'price'), [1, 1, 0, 1])
+        self.assertEqual(self.counts(facets, 'rating'), [1, 2, 2, 2])
+        self.assertEqual(facets['total'], 2)
+
+    def test_query_narrows_every_facet(self):
+        facets = get_search_facets('jacket')
+        self.assertEqual(facets['total'], 1)
+        self.assertEqual(self.counts(facets, 'price'), [0, 0, 0, 1])
+
+    def test_product_change_moves_facets_to_a_fresh_key(self):
+        self.assertEqual(get_search_facets('wildcat')['total'], 4)
+        with self.assertNumQueries(0):
+            get_search_facets('wildcat')
+
+        Product.objects.filter(name='Wildcat Cap').get().delete()
+        self.assertEqual(get_search_facets('wildcat')['total'], 3)
@@ -0,0 +1,83 @@
+import json
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.db import IntegrityError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from store import holds
+from store.inventory import InsufficientStock
+from store.models import Category, Product, StockHold, User
+
+
+@override_settings(CART_HOLDS_ENABLED=True, CART_HOLD_TTL=900)
+class StockHoldTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Apparel')
+        cls.product = Product.objects.create(
+            name='Cap', description='A cap', price=Decimal('10.00'), category=category, quantity=5
+        )
+
+    def test_holds_count_against_other_holders(self):
+        holds.set_hold('cart:1', self.product.id, 3)
+
+        self.assertEqual(holds.get_available_quantity(self.product), 2)
+        self.assertEqual(holds.get_available_quantity(self.product, 'cart:1'), 5)
+        with self.assertRaises(InsufficientStock):
+            holds.set_hold('cart:2', self.product.id, 3)
+
+    def test_setting_zero_releases_the_hold(self):
+        holds.set_hold('cart:1', self.product.id, 3)
+        holds.set_hold('cart:1', self.product.id, 0)
+        self.assertFalse(StockHold.objects.exists())
+
+    def test_expired_holds_stop_counting_and_are_swept(self):
+        holds.set_hold('cart:1', self.product.id, 5)
+        StockHold.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(holds.get_available_quantity(self.product), 5)
+        self.assertEqual(holds.release_expired_holds(), 1)
+        self.assertFalse(StockHold.objects.exists())
+
+    def test_transfer_holds(self):
+        holds.set_hold('session:abc', self.product.id, 2)
+        holds.transfer_holds('session:abc', 'cart:7', {self.product.id: 3})
+        self.assertEqual(list(StockHold.objects.values_list('holder', 'quantity')), [('cart:7', 3)])
+
+
+@override_settings(CART_HOLDS_ENABLED=True, CART_HOLD_TTL=900)
+class CartHoldTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Apparel')
+        cls.product = Product.objects.create(
+            name='Cap', description='A cap', price=Decimal('10.00'), category=category, quantity=5
+        )
+        cls.user = User.objects.create_user('buyer', 'buyer@example.com', 'pw')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def add(self, quantity):
+        return self.client.post('/api/cart/add/', json.dumps({
+            'product_id': self.product.id, 'quantity': quantity
+        }), content_type='application/json').json()
+
+    def test_cart_lines_hold_their_units(self):
+        self.assertTrue(self.add(2)['success'])
+        self.assertEqual(StockHold.objects.get().quantity, 2)
+
+        item_id = self.client.get('/api/cart/').json()['items'][0]['id']
+        self.client.put(f'/api/cart/update/{item_id}/', json.dumps({'quantity': 4}), content_type='application/json')
+        self.assertEqual(StockHold.objects.get().quantity, 4)
+
+        self.client.delete(f'/api/cart/remove/{item_id}/')
+        self.assertFalse(StockHold.objects.exists())
+
+    def test_failed_cart_write_leaves_no_hold(self):
+        with mock.patch('store.views.CartItem.objects.create', side_effect=IntegrityError('boom')):
+            self.assertFalse(self.add(2)['success'])
+        self.assertFalse(StockHold.objects.exists())
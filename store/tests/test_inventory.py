@@ -0,0 +1,94 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.test import TestCase, override_settings
+
+from store import holds
+from store.inventory import InsufficientStock, release_stock, reserve_stock
+from store.models import Category, Product, StockHold
+
+
+class ReserveStockTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Apparel')
+        cls.shirt = Product.objects.create(
+            name='Shirt', description='A shirt', price=Decimal('20.00'), category=category, quantity=5
+        )
+        cls.cap = Product.objects.create(
+            name='Cap', description='A cap', price=Decimal('10.00'), category=category, quantity=2
+        )
+
+    def quantities(self):
+        return dict(Product.objects.values_list('id', 'quantity'))
+
+    def test_reserve_decrements_every_line(self):
+        with transaction.atomic():
+            products = reserve_stock([(self.shirt.id, 2), (self.cap.id, 1)])
+
+        self.assertEqual(set(products), {self.shirt.id, self.cap.id})
+        self.assertEqual(self.quantities(), {self.shirt.id: 3, self.cap.id: 1})
+
+    def test_lines_for_the_same_product_are_added_up(self):
+        # Two sizes of the same shirt, 3 + 3 is more than the 5 in stock
+        with self.assertRaises(InsufficientStock) as raised, transaction.atomic():
+            reserve_stock([(self.shirt.id, 3), (self.shirt.id, 3)])
+
+        self.assertEqual(raised.exception.items, [
+            {'product_id': self.shirt.id, 'product_name': 'Shirt', 'requested': 6, 'available': 5}
+        ])
+        self.assertEqual(self.quantities()[self.shirt.id], 5)
+
+    def test_oversell_takes_nothing(self):
+        with self.assertRaises(InsufficientStock) as raised, transaction.atomic():
+            reserve_stock([(self.shirt.id, 1), (self.cap.id, 3)])
+
+        self.assertEqual([item['product_id'] for item in raised.exception.items], [self.cap.id])
+        # All or nothing, the shirt that was in stock is untouched as well
+        self.assertEqual(self.quantities(), {self.shirt.id: 5, self.cap.id: 2})
+
+    def test_unknown_product_is_reported(self):
+        with self.assertRaises(InsufficientStock) as raised, transaction.atomic():
+            reserve_stock([(999999, 1)])
+
+        self.assertEqual(raised.exception.items, [
+            {'product_id': 999999, 'product_name': None, 'requested': 1, 'available': 0}
+        ])
+
+    def test_error_after_reserving_rolls_back(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            reserve_stock([(self.shirt.id, 5), (self.cap.id, 2)])
+            # e.g. creating the order failed
+            raise RuntimeError('order write failed')
+
+        self.assertEqual(self.quantities(), {self.shirt.id: 5, self.cap.id: 2})
+
+    def test_second_reservation_cannot_oversell(self):
+        with transaction.atomic():
+            reserve_stock([(self.cap.id, 2)])
+        with self.assertRaises(InsufficientStock) as raised, transaction.atomic():
+            reserve_stock([(self.cap.id, 1)])
+
+        self.assertEqual(raised.exception.items[0]['available'], 0)
+        self.assertEqual(self.quantities()[self.cap.id], 0)
+
+    def test_release_puts_stock_back(self):
+        with transaction.atomic():
+            reserve_stock([(self.shirt.id, 4), (self.cap.id, 2)])
+        release_stock([(self.shirt.id, 1), (self.shirt.id, 3), (self.cap.id, 2)])
+
+        self.assertEqual(self.quantities(), {self.shirt.id: 5, self.cap.id: 2})
+
+    @override_settings(CART_HOLDS_ENABLED=True, CART_HOLD_TTL=900)
+    def test_units_held_by_other_carts_are_not_available(self):
+        holds.set_hold('cart:1', self.shirt.id, 4)
+
+        with self.assertRaises(InsufficientStock) as raised, transaction.atomic():
+            reserve_stock([(self.shirt.id, 2)], holder='cart:2')
+        self.assertEqual(raised.exception.items[0]['available'], 1)
+
+        # The holder can check out what it holds, and its holds go with the order
+        with transaction.atomic():
+            reserve_stock([(self.shirt.id, 4)], holder='cart:1')
+        self.assertEqual(self.quantities()[self.shirt.id], 1)
+        self.assertFalse(StockHold.objects.exists())
@@ -0,0 +1,34 @@
+from decimal import Decimal
+
+from django.test import TestCase
+
+from store.models import Category, Product, ProductPopularity
+from store.product_features import get_popular_products
+
+
+class PopularProductsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Apparel')
+        cls.products = [
+            Product.objects.create(name=f'Cap {i}', description='A cap', price=Decimal('10.00'), category=category, rating=i)
+            for i in range(5)
+        ]
+        for product, orders, units_7d in [(cls.products[0], 5, 1), (cls.products[1], 9, 0), (cls.products[2], 2, 4)]:
+            ProductPopularity.objects.create(product=product, order_count=orders, units_sold=orders, units_7d=units_7d)
+
+    def test_ranked_by_counter(self):
+        self.assertEqual(list(get_popular_products(limit=3)), [self.products[1], self.products[0], self.products[2]])
+
+    def test_window_counter(self):
+        self.assertEqual(list(get_popular_products(limit=2, window='7d')), [self.products[2], self.products[0]])
+
+    def test_short_list_is_padded_by_rating(self):
+        self.assertEqual(
+            list(get_popular_products(limit=5, window='7d')),
+            [self.products[2], self.products[0], self.products[4], self.products[3], self.products[1]]
+        )
+
+    def test_unlisted_products_are_left_out(self):
+        Product.objects.filter(id=self.products[1].id).update(is_listed=False)
+        self.assertNotIn(self.products[1], list(get_popular_products(limit=5)))
@@ -0,0 +1,156 @@
+import json
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase
+from django.utils import timezone
+
+from store import reviews
+from store.models import Category, Product, Review, User
+
+
+class ReviewApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Apparel')
+        cls.product = Product.objects.create(name='Cap', description='A cap', price=Decimal('10.00'), category=category)
+        cls.admin = User.objects.create_user('admin', 'admin@example.com', 'pw', role='admin')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def test_add_review_reports_new_rating(self):
+        response = self.client.post('/api/reviews/add/', json.dumps({
+            'product_id': self.product.id, 'rating': 4, 'comment': 'Nice'
+        }), content_type='application/json').json()
+
+        self.assertEqual(response['product_avg_rating'], 4.0)
+        self.assertEqual(response['review']['product_rating'], 4.0)
+
+    def test_update_review_reports_new_rating(self):
+        added = self.client.post('/api/reviews/add/', json.dumps({
+            'product_id': self.product.id, 'rating': 4, 'comment': 'Nice'
+        }), content_type='application/json').json()
+
+        response = self.client.put(f"/api/reviews/{added['review']['id']}/update/", json.dumps({
+            'rating': 2
+        }), content_type='application/json').json()
+
+        self.assertEqual(response['product_avg_rating'], 2.0)
+        self.assertEqual(response['review']['product_rating'], 2.0)
+
+    def test_deleting_twice_counts_once(self):
+        added = self.client.post('/api/reviews/add/', json.dumps({
+            'product_id': self.product.id, 'rating': 5, 'comment': 'Great'
+        }), content_type='application/json').json()
+        url = f"/api/reviews/{added['review']['id']}/delete/"
+
+        self.assertTrue(self.client.delete(url).json()['success'])
+        self.assertFalse(self.client.delete(url).json()['success'])
+
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.review_count, self.product.rating_sum), (0, 0))
+        self.assertFalse(Review.objects.exists())
+
+
+class ReviewAggregateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Apparel')
+        cls.product = Product.objects.create(name='Cap', description='A cap', price=Decimal('10.00'), category=category)
+        cls.user = User.objects.create_user('reviewer', 'reviewer@example.com', 'pw')
+
+    def add(self, rating):
+        with transaction.atomic():
+            review = Review.objects.create(
+                product=self.product, user=self.user, username='reviewer', rating=rating, comment='Ok'
+            )
+            reviews.review_added(review)
+        return review
+
+    def aggregates(self):
+        self.product.refresh_from_db()
+        return self.product.review_count, self.product.rating_sum, self.product.rating
+
+    def test_deltas_keep_count_sum_rating_and_histogram(self):
+        five = self.add(5)
+        self.add(2)
+        self.add(5)
+        self.assertEqual(self.aggregates(), (3, 12, 4.0))
+        self.assertEqual(reviews.get_rating_histogram(self.product), {5: 2, 4: 0, 3: 0, 2: 1, 1: 0})
+
+        five.rating = 3
+        five.save()
+        reviews.review_rating_changed(five, 5)
+        self.assertEqual(self.aggregates(), (3, 10, 10 / 3))
+        self.assertEqual(reviews.get_rating_histogram(self.product), {5: 1, 4: 0, 3: 1, 2: 1, 1: 0})
+
+    def test_removing_the_last_review_resets_the_rating(self):
+        review = self.add(4)
+        self.assertTrue(reviews.delete_review(review))
+        self.assertEqual(self.aggregates(), (0, 0, 0.0))
+        self.assertFalse(reviews.delete_review(review))
+        self.assertEqual(self.aggregates(), (0, 0, 0.0))
+
+    def test_reconcile_fixes_drifted_products(self):
+        self.add(4)
+        self.add(2)
+        # Changes made without going through reviews.py, so no deltas were applied
+        Review.objects.filter(rating=2).delete()
+        Product.objects.filter(id=self.product.id).update(rating_5_count=7)
+
+        self.assertEqual(reviews.reconcile_review_aggregates(), 1)
+        self.assertEqual(self.aggregates(), (1, 4, 4.0))
+        self.assertEqual(reviews.get_rating_histogram(self.product), {5: 0, 4: 1, 3: 0, 2: 0, 1: 0})
+        self.assertEqual(reviews.reconcile_review_aggregates(), 0)
+
+
+class ReviewPageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Apparel')
+        cls.product = Product.objects.create(name='Cap', description='A cap', price=Decimal('10.00'), category=category)
+        user = User.objects.create_user('reviewer', 'reviewer@example.com', 'pw')
+
+        start = timezone.now() - timedelta(days=10)
+        # Pairs of reviews share a timestamp, so the id has to break the tie
+        for i, rating in enumerate([5, 1, 4, 4, 2, 5, 3]):
+            review = Review.objects.create(product=cls.product, user=user, username='reviewer', rating=rating, comment='Ok')
+            Review.objects.filter(id=review.id).update(created_at=start + timedelta(hours=i // 2))
+
+    def all_pages(self, sort, limit=2, **filters):
+        ids, cursor = [], None
+        while True:
+            page, cursor = reviews.get_review_page(self.product, sort=sort, cursor=cursor, limit=limit, **filters)
+            self.assertLessEqual(len(page), limit)
+            ids.extend(review.id for review in page)
+            if cursor is None:
+                return ids
+
+    def test_pages_follow_every_sort(self):
+        for sort, keys in reviews.REVIEW_SORTS.items():
+            ordering = [f"-{field}" if descending else field for field, descending in keys]
+            expected = list(Review.objects.order_by(*ordering).values_list('id', flat=True))
+            with self.subTest(sort=sort):
+                self.assertEqual(self.all_pages(sort), expected)
+
+    def test_rating_filter(self):
+        expected = list(Review.objects.filter(rating=4).order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(self.all_pages('newest', limit=1, rating=4), expected)
+
+    def test_last_page_has_no_cursor(self):
+        page, cursor = reviews.get_review_page(self.product, limit=7)
+        self.assertEqual(len(page), 7)
+        self.assertIsNone(cursor)
+
+    def test_cursor_must_match_the_sort(self):
+        _, cursor = reviews.get_review_page(self.product, sort='newest', limit=2)
+        with self.assertRaises(ValueError):
+            reviews.get_review_page(self.product, sort='highest', cursor=cursor)
+        with self.assertRaises(ValueError):
+            reviews.get_review_page(self.product, cursor='not-a-cursor')
+        with self.assertRaises(ValueError):
+            reviews.get_review_page(self.product, sort='best')
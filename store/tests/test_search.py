@@ -0,0 +1,124 @@
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from store import search
+from store.models import Category, Product
+
+
+class SearchIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Apparel')
+        cls.hoodie = Product.objects.create(
+            name='Wildcat Hoodie', description='Warm fleece hoodie', price=Decimal('45.00'),
+            category=cls.category, quantity=5, keywords='fleece, winter'
+        )
+        cls.shirt = Product.objects.create(
+            name='Wildcat Shirt', description='Cotton shirt with a hoodie print', price=Decimal('20.00'),
+            category=cls.category, quantity=5
+        )
+        cls.cap = Product.objects.create(
+            name='Team Cap', description='Adjustable cap', price=Decimal('15.00'), category=cls.category, quantity=5
+        )
+
+    def setUp(self):
+        cache.clear()
+        # The indexes are per process, start every test from the database
+        for index in search.INDEXES:
+            index._built = False
+
+    def test_name_matches_rank_first(self):
+        self.assertEqual(search.full_text_index.search('hoodies'), [self.hoodie.id, self.shirt.id])
+
+    def test_last_word_matches_as_prefix(self):
+        self.assertEqual(search.full_text_index.search('wildcat hoo')[0], self.hoodie.id)
+        self.assertEqual(search.full_text_index.search('adjust'), [self.cap.id])
+
+    def test_stop_words_only_finds_nothing(self):
+        self.assertEqual(search.full_text_index.search('the and of'), [])
+
+    def test_did_you_mean_tolerates_typos(self):
+        self.assertEqual(search.trigram_index.similar('wildcat hodie', limit=1), [self.hoodie.id])
+
+    def test_completions(self):
+        completions = search.completion_index.complete('wild')
+        self.assertEqual(
+            {(c['text'], c['type']) for c in completions},
+            {('Wildcat Hoodie', 'product'), ('Wildcat Shirt', 'product')}
+        )
+        self.assertIn({'text': 'winter', 'type': 'keyword'}, search.completion_index.complete('win'))
+
+    def test_saved_product_is_reindexed(self):
+        search.full_text_index.search('cap')
+
+        self.cap.name = 'Team Beanie'
+        self.cap.save()
+        self.assertEqual(search.full_text_index.search('beanie'), [self.cap.id])
+
+        self.cap.is_listed = False
+        self.cap.save()
+        self.assertEqual(search.full_text_index.search('beanie'), [])
+
+    def test_deleted_product_leaves_the_index(self):
+        self.assertEqual(search.full_text_index.search('cap'), [self.cap.id])
+        self.cap.delete()
+        self.assertEqual(search.full_text_index.search('cap'), [])
+
+    def test_change_from_another_process_triggers_a_rebuild(self):
+        search.full_text_index.search('cap')
+
+        # An update() elsewhere skips this process's signals, only the generation moves
+        Product.objects.filter(id=self.cap.id).update(name='Team Visor')
+        search.categories_changed()
+        self.assertEqual(search.full_text_index.search('visor'), [self.cap.id])
+
+
+class SearchResultCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Apparel')
+        cls.cap = Product.objects.create(
+            name='Team Cap', description='Adjustable cap', price=Decimal('15.00'), category=cls.category, quantity=5
+        )
+
+    def setUp(self):
+        cache.clear()
+        for index in search.INDEXES:
+            index._built = False
+
+    def test_results_are_cached(self):
+        list(Product.search('cap'))
+        with self.assertNumQueries(1):
+            self.assertEqual([p.id for p in Product.search('  CAP ')], [self.cap.id])
+
+    def test_product_change_invalidates_results(self):
+        key = search.search_results_key('cap', None, None, None, None)
+        list(Product.search('cap'))
+        self.assertIsNotNone(cache.get(key))
+
+        cap2 = Product.objects.create(
+            name='Spare Cap', description='Another cap', price=Decimal('12.00'), category=self.category, quantity=5
+        )
+        self.assertNotEqual(search.search_results_key('cap', None, None, None, None), key)
+        self.assertEqual({p.id for p in Product.search('cap')}, {self.cap.id, cap2.id})
+
+        cap2.delete()
+        self.assertEqual([p.id for p in Product.search('cap')], [self.cap.id])
+
+    def test_category_change_invalidates_results(self):
+        list(Product.search(category='Apparel'))
+        self.category.name = 'Headwear'
+        self.category.save()
+
+        self.assertEqual(list(Product.search(category='Apparel')), [])
+        self.assertEqual([p.id for p in Product.search(category='Headwear')], [self.cap.id])
+
+    def test_update_without_signals_invalidates_through_product_data_changed(self):
+        from store import signals
+
+        list(Product.search(min_price=10))
+        Product.objects.filter(id=self.cap.id).update(price=Decimal('5.00'))
+        signals.product_data_changed([self.cap.id])
+        self.assertEqual(list(Product.search(min_price=10)), [])
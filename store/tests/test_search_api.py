@@ -0,0 +1,94 @@
+import json
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from store.models import Category, Product
+
+
+class SearchApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Apparel')
+        for name, price in [('Red Cap', '19.99'), ('Blue Cap', '49.99'), ('Green Cap', '50.00'), ('Gold Cap', '120.00')]:
+            Product.objects.create(name=name, description='A cap', price=Decimal(price), category=cls.category, quantity=5)
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, **params):
+        response = self.client.get('/api/search/', params)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(b''.join(response.streaming_content))
+
+    def test_response_is_valid_json_with_facets(self):
+        data = self.get(category='Apparel')
+        self.assertEqual(len(data['results']), 4)
+        self.assertEqual(
+            [(bucket['min_price'], bucket['max_price'], bucket['count']) for bucket in data['facets']['price']],
+            [(None, 24.99, 1), (25.0, 49.99, 1), (50.0, 99.99, 1), (100.0, None, 1)]
+        )
+
+    def test_price_bucket_matches_its_filter(self):
+        data = self.get(category='Apparel')
+        for bucket in data['facets']['price']:
+            params = {'category': 'Apparel'}
+            if bucket['min_price'] is not None:
+                params['min_price'] = bucket['min_price']
+            if bucket['max_price'] is not None:
+                params['max_price'] = bucket['max_price']
+            self.assertEqual(len(self.get(**params)['results']), bucket['count'], bucket['label'])
+
+    def test_query_results(self):
+        data = self.get(query='cap', fields='id,name')
+        self.assertEqual(len(data['results']), 4)
+        self.assertEqual(set(data['results'][0]), {'id', 'name'})
+
+
+class SearchApiPagingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Apparel')
+        cls.products = [
+            Product.objects.create(name=f'Cap {i}', description='A wool cap', price=Decimal('10.00'), category=category)
+            for i in range(7)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def pages(self, **params):
+        ids = []
+        cursor = None
+        while True:
+            if cursor:
+                params['cursor'] = cursor
+            response = self.client.get('/api/search/', {**params, 'limit': 3})
+            data = json.loads(b''.join(response.streaming_content))
+            ids.extend(product['id'] for product in data['results'])
+            cursor = data['next_cursor']
+            self.assertEqual(data['has_more'], cursor is not None)
+            if not cursor:
+                return ids
+
+    def test_listing_pages_through_newest_first(self):
+        expected = list(Product.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(self.pages(category='Apparel'), expected)
+
+    def test_listing_pages_dont_shift_on_insert(self):
+        first = json.loads(b''.join(self.client.get('/api/search/', {'category': 'Apparel', 'limit': 3}).streaming_content))
+        Product.objects.create(name='Cap new', description='A wool cap', price=Decimal('10.00'), category=self.products[0].category)
+
+        second = json.loads(b''.join(self.client.get('/api/search/', {
+            'category': 'Apparel', 'limit': 3, 'cursor': first['next_cursor']
+        }).streaming_content))
+        seen = [product['id'] for product in first['results'] + second['results']]
+        self.assertEqual(len(seen), len(set(seen)))
+
+    def test_ranked_results_page_through_every_match(self):
+        self.assertEqual(sorted(self.pages(query='wool')), sorted(product.id for product in self.products))
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/search/', {'category': 'Apparel', 'cursor': 'nope'})
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,73 @@
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+
+from store import view_buffer
+from store.models import Category, Product, ProductInterest, ProductView, User
+
+
+class ViewBufferTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Apparel')
+        cls.product = Product.objects.create(name='Cap', description='A cap', price=Decimal('10.00'), category=category)
+        cls.user = User.objects.create_user('viewer', 'viewer@example.com', 'pw')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_flush_writes_views_and_interests(self):
+        for _ in range(3):
+            view_buffer.record_view(self.user.id, self.product.id, ['cap', 'hat'])
+
+        self.assertEqual(view_buffer.flush_views(), 3)
+        self.assertEqual(ProductView.objects.count(), 3)
+        self.assertEqual(
+            dict(ProductInterest.objects.values_list('keyword', 'view_count')),
+            {'cap': 3, 'hat': 3}
+        )
+        self.assertEqual(view_buffer.flush_views(), 0)
+
+    def test_views_keep_the_time_they_happened(self):
+        viewed_at = timezone.now() - timedelta(days=2)
+        with mock.patch('store.view_buffer.timezone.now', return_value=viewed_at):
+            view_buffer.record_view(self.user.id, self.product.id, [])
+
+        view_buffer.flush_views()
+        self.assertEqual(ProductView.objects.get().viewed_at, viewed_at)
+
+    def test_flush_waits_for_claimed_events(self):
+        view_buffer.record_view(self.user.id, self.product.id, [])
+        # A view that took its index but hasn't stored its event yet
+        pending = view_buffer._claim_index()
+        view_buffer.record_view(self.user.id, self.product.id, [])
+
+        self.assertEqual(view_buffer.flush_views(), 1)
+        cache.set(view_buffer._event_key(pending), (self.user.id, self.product.id, [], timezone.now()))
+        self.assertEqual(view_buffer.flush_views(), 2)
+        self.assertEqual(ProductView.objects.count(), 3)
+
+    def test_flush_gives_up_on_events_never_stored(self):
+        view_buffer._claim_index()
+        view_buffer.record_view(self.user.id, self.product.id, [])
+        self.assertEqual(view_buffer.flush_views(), 0)
+
+        later = timezone.now().timestamp() + view_buffer.VIEW_CLAIM_TIMEOUT
+        with mock.patch('store.view_buffer.time.time', return_value=later):
+            self.assertEqual(view_buffer.flush_views(), 2)
+        self.assertEqual(ProductView.objects.count(), 1)
+
+    def test_evicted_tail_restarts_at_head(self):
+        for _ in range(2):
+            view_buffer.record_view(self.user.id, self.product.id, [])
+        view_buffer.flush_views()
+
+        cache.delete(view_buffer.TAIL_KEY)
+        view_buffer.record_view(self.user.id, self.product.id, [])
+
+        self.assertEqual(view_buffer.flush_views(), 1)
+        self.assertEqual(ProductView.objects.count(), 3)
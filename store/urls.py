@@ -24,10 +24,15 @@ urlpatterns = [
     path('api/reviews/add/', views.add_review_api, name='add_review_api'),
     path('api/reviews/<int:review_id>/update/', views.update_review_api, name='update_review_api'),
     path('api/reviews/<int:review_id>/delete/', views.delete_review_api, name='delete_review_api'),
+    path('api/reviews/can-review/', api_views.check_review_eligibility_bulk, name='check_review_eligibility_bulk'),
     path('api/reviews/can-review/<int:product_id>/', api_views.check_review_eligibility, name='check_review_eligibility'),
+    path('api/products/<int:product_id>/reviews/', api_views.product_reviews_api, name='product_reviews_api'),
     
     # Product details API endpoints
     path('api/products/', api_views.api_products, name='api_products'),
+    path('api/search/', api_views.search_api, name='search_api'),
+    path('api/search/autocomplete/', api_views.search_autocomplete_api, name='search_autocomplete_api'),
+    path('api/outbound-metrics/', api_views.outbound_metrics_api, name='outbound_metrics_api'),
     path('api/products/<str:product_id>/', api_views.api_product_detail, name='api_product_detail'),
     path('api/pokemon/<str:pokemon_name>/', api_views.api_pokemon_data, name='api_pokemon_data'),
     path('api/weather/<str:city_name>/', api_views.api_weather_data, name='api_weather_data'),
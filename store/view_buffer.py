@@ -0,0 +1,194 @@
+# view_buffer.py - Buffer product views in the cache and write them to the database in bulk
+
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import ProductInterest, ProductView
+from .recommendations import INTEREST_MIN_VIEWS, invalidate_recommendations
+
+logger = logging.getLogger(__name__)
+
+# Flush once this many views are waiting, or when the oldest flush is this many seconds old
+VIEW_BUFFER_SIZE = 50
+VIEW_FLUSH_INTERVAL = 60
+
+# Most views written per flush (the flush_product_views command loops until the buffer is empty)
+MAX_FLUSH_BATCH = 1000
+
+# Buffered views are dropped if nothing flushes them for this long
+VIEW_EVENT_TIMEOUT = 60 * 60 * 24
+
+# A flush waits this long for a view that took its index but hasn't stored its event yet,
+# after that the index is given up on (its request died, or the event expired)
+VIEW_CLAIM_TIMEOUT = 30
+
+HEAD_KEY = 'product_view_buffer_head'  # Next event index to flush
+TAIL_KEY = 'product_view_buffer_tail'  # Last event index written
+FLUSHED_AT_KEY = 'product_view_buffer_flushed_at'
+GAP_KEY = 'product_view_buffer_gap'  # (tail, time) when a flush first found a missing event
+LOCK_KEY = 'product_view_buffer_lock'
+
+
+def _event_key(index):
+    return f"product_view_buffer_{index}"
+
+
+def _claim_index():
+    """Take the next event index, restarting from HEAD if TAIL was evicted from the cache"""
+    start = cache.get(HEAD_KEY, 1) - 1
+    cache.add(TAIL_KEY, start, None)
+    try:
+        return cache.incr(TAIL_KEY)
+    except ValueError:
+        # Key was evicted between add and incr
+        cache.set(TAIL_KEY, start + 1, None)
+        return start + 1
+
+
+def record_view(user_id, product_id, keywords):
+    """
+    Add a view to the buffer, starting a background flush when a threshold is reached
+    The event carries the time of the view, so it is stored with that time however late it is flushed
+    """
+    index = _claim_index()
+    cache.set(_event_key(index), (user_id, product_id, keywords, timezone.now()), VIEW_EVENT_TIMEOUT)
+
+    cache.add(FLUSHED_AT_KEY, time.time(), None)
+    pending = index - cache.get(HEAD_KEY, 1) + 1
+    if pending >= VIEW_BUFFER_SIZE or time.time() - cache.get(FLUSHED_AT_KEY, 0) >= VIEW_FLUSH_INTERVAL:
+        threading.Thread(target=_flush_in_background, daemon=True).start()
+
+
+def _flush_in_background():
+    try:
+        flush_views()
+    except Exception as e:
+        logger.error(f"Failed to flush product views: {e}")
+    finally:
+        # Threads get their own database connection, don't leave it open
+        connection.close()
+
+
+def flush_views(max_batch=MAX_FLUSH_BATCH):
+    """
+    Write buffered views to the database, returns the number of buffer indexes processed
+    Only one flush runs at a time, others return 0 straight away
+
+    HEAD only moves up to the first missing event: the flush may have landed between a view
+    taking its index and storing its event. Missing events are only skipped once they have
+    been missing for VIEW_CLAIM_TIMEOUT seconds (their view is lost then, e.g. it expired).
+    """
+    if not cache.add(LOCK_KEY, True, 60):
+        return 0
+
+    try:
+        head = cache.get(HEAD_KEY, 1)
+        last_index = cache.get(TAIL_KEY, 0)
+        tail = min(last_index, head + max_batch - 1)
+        now = time.time()
+        cache.set(FLUSHED_AT_KEY, now, None)
+        if tail < head:
+            return 0
+
+        found = cache.get_many([_event_key(index) for index in range(head, tail + 1)])
+        gap = cache.get(GAP_KEY)
+        # Indexes up to here were claimed over VIEW_CLAIM_TIMEOUT ago, missing ones won't be stored
+        given_up_to = gap[0] if gap and now - gap[1] >= VIEW_CLAIM_TIMEOUT else 0
+
+        events = []
+        skipped = 0
+        next_head = tail + 1
+        for index in range(head, tail + 1):
+            event = found.get(_event_key(index))
+            if event is not None:
+                events.append(event)
+            elif index > given_up_to:
+                next_head = index
+                break
+            else:
+                skipped += 1
+        if skipped:
+            logger.warning(f"Skipped {skipped} buffered product views whose events were never stored or expired")
+
+        if next_head <= tail:
+            if not gap or gap[0] < next_head:
+                # Start waiting for every index claimed so far
+                cache.set(GAP_KEY, (last_index, now), None)
+        elif gap and gap[0] < next_head:
+            cache.delete(GAP_KEY)
+
+        _write_views(events)
+
+        cache.set(HEAD_KEY, next_head, None)
+        cache.delete_many([_event_key(index) for index in range(head, next_head)])
+        return next_head - head
+    finally:
+        cache.delete(LOCK_KEY)
+
+
+def _write_views(events):
+    """Store a batch of view events: one bulk insert for views, one upsert for interests"""
+    if not events:
+        return
+
+    interest_counts = Counter()
+    for user_id, _, keywords, _ in events:
+        for keyword in set(keywords):
+            interest_counts[(user_id, keyword)] += 1
+
+    with transaction.atomic():
+        ProductView.objects.bulk_create(
+            [ProductView(user_id=user_id, product_id=product_id, viewed_at=viewed_at)
+             for user_id, product_id, _, viewed_at in events],
+            batch_size=500
+        )
+        if interest_counts:
+            _upsert_interests(interest_counts)
+
+    _invalidate_new_interests(interest_counts)
+
+
+def _upsert_interests(interest_counts):
+    """Add view counts to ProductInterest rows in a single INSERT ... ON CONFLICT statement"""
+    table = connection.ops.quote_name(ProductInterest._meta.db_table)
+    now = timezone.now()
+
+    rows = []
+    params = []
+    for (user_id, keyword), count in interest_counts.items():
+        rows.append('(%s, %s, %s, %s)')
+        params.extend([user_id, keyword, count, now])
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (user_id, keyword, view_count, last_viewed) "
+            f"VALUES {', '.join(rows)} "
+            f"ON CONFLICT (user_id, keyword) DO UPDATE SET "
+            f"view_count = {table}.view_count + EXCLUDED.view_count, "
+            f"last_viewed = EXCLUDED.last_viewed",
+            params
+        )
+
+
+def _invalidate_new_interests(interest_counts):
+    """Drop recommendations of users whose views in this batch created a new interest"""
+    user_ids = {user_id for user_id, _ in interest_counts}
+    keywords = {keyword for _, keyword in interest_counts}
+    crossed = set()
+
+    for user_id, keyword, view_count in ProductInterest.objects.filter(
+        user_id__in=user_ids, keyword__in=keywords, view_count__gte=INTEREST_MIN_VIEWS
+    ).values_list('user_id', 'keyword', 'view_count'):
+        added = interest_counts.get((user_id, keyword), 0)
+        if added and view_count - added < INTEREST_MIN_VIEWS:
+            logger.info(f"User {user_id} now has interest in '{keyword}'")
+            crossed.add(user_id)
+
+    for user_id in crossed:
+        invalidate_recommendations(user_id)
@@ -0,0 +1,106 @@
+# view_stats.py - Daily product view aggregates: compaction of raw ProductView rows and queries on them
+
+import logging
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import ProductView, ProductViewDaily, UserViewDaily
+
+logger = logging.getLogger(__name__)
+
+# Raw views are kept this many days, older ones only live on in the daily tables
+VIEW_RETENTION_DAYS = 30
+
+
+def _start_of_day(date):
+    return timezone.make_aware(datetime.combine(date, time.min))
+
+
+def compact_views(retention_days=VIEW_RETENTION_DAYS):
+    """
+    Roll raw views of every finished day into the daily tables, then delete raw views
+    older than the retention window. Days are recomputed from scratch, so running it
+    more than once is safe. Returns (days compacted, raw rows deleted).
+    """
+    today = timezone.localdate()
+    raw = ProductView.objects.filter(viewed_at__lt=_start_of_day(today)).annotate(date=TruncDate('viewed_at'))
+
+    product_rows = [
+        ProductViewDaily(product_id=row['product_id'], date=row['date'],
+                         view_count=row['views'], unique_users=row['users'])
+        for row in raw.values('product_id', 'date').annotate(
+            views=Count('id'), users=Count('user_id', distinct=True)
+        ).order_by()
+    ]
+    user_rows = [
+        UserViewDaily(user_id=row['user_id'], product_id=row['product_id'], date=row['date'], view_count=row['views'])
+        for row in raw.values('user_id', 'product_id', 'date').annotate(views=Count('id')).order_by()
+    ]
+
+    cutoff = _start_of_day(today - timedelta(days=retention_days))
+    with transaction.atomic():
+        ProductViewDaily.objects.bulk_create(
+            product_rows, batch_size=1000, update_conflicts=True,
+            unique_fields=['product', 'date'], update_fields=['view_count', 'unique_users']
+        )
+        UserViewDaily.objects.bulk_create(
+            user_rows, batch_size=1000, update_conflicts=True,
+            unique_fields=['user', 'product', 'date'], update_fields=['view_count']
+        )
+        deleted, _ = ProductView.objects.filter(viewed_at__lt=cutoff).delete()
+
+    days = len({row.date for row in product_rows})
+    logger.info(f"Compacted {days} days of product views, pruned {deleted} raw views")
+    return days, deleted
+
+
+# --- Queries ---
+
+def _recent_raw_views(since):
+    """Raw views that aren't in the daily tables yet (after the last compacted day)"""
+    last_compacted = ProductViewDaily.objects.aggregate(last=Max('date'))['last']
+    start = since
+    if last_compacted is not None:
+        start = max(since, _start_of_day(last_compacted + timedelta(days=1)))
+    return ProductView.objects.filter(viewed_at__gte=start)
+
+
+def get_product_view_counts(days=30, product_ids=None):
+    """Get {product_id: views} over the last days days"""
+    since_date = timezone.localdate() - timedelta(days=days - 1)
+
+    daily = ProductViewDaily.objects.filter(date__gte=since_date)
+    raw = _recent_raw_views(_start_of_day(since_date))
+    if product_ids is not None:
+        daily = daily.filter(product_id__in=product_ids)
+        raw = raw.filter(product_id__in=product_ids)
+
+    counts = dict(daily.values('product_id').annotate(views=Sum('view_count')).values_list('product_id', 'views'))
+    for product_id, views in raw.values('product_id').annotate(views=Count('id')).values_list('product_id', 'views'):
+        counts[product_id] = counts.get(product_id, 0) + views
+    return counts
+
+
+def get_most_viewed_products(days=7, limit=10):
+    """Get [(product_id, views)] for the most viewed products over the last days days"""
+    counts = get_product_view_counts(days)
+    return sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+
+def get_user_viewed_product_ids(user, days=30, limit=20):
+    """Get the ids of the products a user viewed most over the last days days"""
+    since_date = timezone.localdate() - timedelta(days=days - 1)
+
+    counts = dict(
+        UserViewDaily.objects.filter(user=user, date__gte=since_date)
+        .values('product_id').annotate(views=Sum('view_count')).values_list('product_id', 'views')
+    )
+    raw = _recent_raw_views(_start_of_day(since_date)).filter(user=user)
+    for product_id, views in raw.values('product_id').annotate(views=Count('id')).values_list('product_id', 'views'):
+        counts[product_id] = counts.get(product_id, 0) + views
+
+    return [product_id for product_id, _ in sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:limit]]
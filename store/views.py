@@ -2,16 +2,15 @@
 
 import os
 import json
-import random
-import requests
+import uuid
 import logging
 from django.http import HttpResponse, JsonResponse
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, get_object_or_404, redirect
 from django.http import Http404
-from django.db import models, connection
-from django.db.models import Q, Count, Max, F, Value, BooleanField, Prefetch
+from django.db import models, connection, transaction
+from django.db.models import Q, Count, Max, Value, BooleanField, Prefetch
 from django.db.models.functions import Concat
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.hashers import make_password
@@ -22,6 +21,19 @@ from .models import (
     Cart, CartItem, Order, OrderItem,
     User, Message, Conversation, Notification, NotificationSettings
 )
+from .related import get_related_products
+from .sampling import listed_product_sampler
+from .popularity import record_order
+from .purchases import add_purchased_products
+from .cart_store import SessionCart
+from .inventory import reserve_stock, InsufficientStock
+from .holds import holds_enabled, set_hold, apply_available_stock, get_available_quantity
+from .search import ordered_by_ids
+from .keywords import sync_product_keywords
+from .reviews import (
+    review_added, review_rating_changed, delete_review,
+    get_rating_histogram, get_review_page
+)
 
 from django.core.cache import cache
 from django.conf import settings
@@ -56,9 +68,11 @@ def home(request):
         cache.set('all_categories', categories, 3600)
 
     # Query products based on sort option
-    if sort_by == 'recommended' and request.user.is_authenticated:
-        from .product_features import get_recommended_products
-        products = get_recommended_products(request.user, limit=100)
+    recommended = sort_by == 'recommended' and request.user.is_authenticated
+    if recommended:
+        # Precomputed ranked ids, only the current page is loaded below
+        from .recommendations import get_recommended_product_ids
+        products = get_recommended_product_ids(request.user)
     elif sort_by == 'popular':
         from .product_features import get_popular_products
         products = get_popular_products(limit=100)
@@ -88,6 +102,12 @@ def home(request):
     except EmptyPage:
         products_page = paginator.page(paginator.num_pages)
 
+    if recommended:
+        products_page.object_list = list(ordered_by_ids(
+            Product.objects.filter(is_listed=True).select_related('category', 'user').prefetch_related('visuals'),
+            products_page.object_list
+        ))
+
     return render(request, 'index.html', {
         'categories': categories,
         'products': products_page,
@@ -102,6 +122,9 @@ def product_detail(request, product_id=None):
     Optimizations:
     1. Reviews are prefetched with select_related to avoid N+1 queries
     2. Suggested products query uses prefetching for categories
+    3. No outbound calls while rendering, Pokemon and weather data are loaded by the page from /api/products/<id>/
+    4. The product and suggestion fragments are cached per product in store.html and
+       suggestions are only computed when those fragments have to be re-rendered
     """
     # Use the request parameter if not explicitly provided
     if not product_id:
@@ -121,147 +144,44 @@ def product_detail(request, product_id=None):
         product = cached_data.get('product')
         visuals = cached_data.get('visuals')
         product_features = cached_data.get('product_features')
-        pokemon_data = cached_data.get('pokemon_data')
+        fragment_version = cached_data.get('fragment_version')
     else:
         # Get product by ID
-        product = get_object_or_404(Product, id=product_id)
+        product = get_object_or_404(Product.objects.select_related('category'), id=product_id)
         
         # Get visuals for a product
-        visuals = VisualContent.objects.filter(product=product)
+        visuals = list(VisualContent.objects.filter(product=product))
         
         # Split features into a list
         product_features = product.get_features_list()
         
-        # Get Pokemon data (server-side API call)
-        pokemon_data = None
-        if product.pokemon:
-            try:
-                pokemon_response = requests.get(f"https://pokeapi.co/api/v2/pokemon/{product.pokemon.lower()}")
-                if pokemon_response.status_code == 200:
-                    pokemon_json = pokemon_response.json()
-                    pokemon_data = {
-                        'name': pokemon_json.get('name', '').capitalize(),
-                        'sprite': pokemon_json.get('sprites', {}).get('front_default', ''),
-                        'types': [t.get('type', {}).get('name', '').capitalize() for t in pokemon_json.get('types', [])],
-                    }
-            except Exception as e:
-                logger.error(f"Error fetching Pokemon data: {str(e)}")
+        # Rendered fragments are keyed on this, so they go stale together with this entry
+        # (signals.py deletes it whenever the product changes)
+        fragment_version = uuid.uuid4().hex
         
         # Cache the data for 30 minutes (1800 seconds)
         cache.set(cache_key, {
             'product': product,
             'visuals': visuals,
             'product_features': product_features, 
-            'pokemon_data': pokemon_data
+            'fragment_version': fragment_version
         }, 1800)
 
+    # Pokemon and weather data are loaded by the page from /api/products/<id>/, not here
+
     # Track user interest if authenticated
     if request.user.is_authenticated:
         from .product_features import track_product_view
         track_product_view(request.user, product)
 
     
-    # ORM Query: Get reviews for this product
+    # ORM Query: Get the first page of reviews for this product
     # Equivalent SQL Query:
-    # SELECT * FROM store_review WHERE product_id = %s ORDER BY created_at DESC
+    # SELECT * FROM store_review WHERE product_id = %s ORDER BY created_at DESC, id DESC LIMIT 11
 
-    # Get reviews with prefetching to avoid N+1 queries
+    # Only the first page is rendered, the rest is loaded from the reviews API
     # This isn't cached because reviews change frequently and are user-specific
-    reviews = Review.objects.filter(product_id=product_id)\
-                           .select_related('user')\
-                           .order_by('-created_at')
-    
-    # ORM Query: Get all products except current
-    # Equivalent SQL Query:
-    # SELECT * FROM store_product WHERE id != %s
-
-    # Recommendation products features with prefetching:
-    # Get products efficiently with prefetch_related
-    all_products = Product.objects.exclude(id=product_id)\
-                           .select_related('category', 'user')\
-                           .filter(is_listed=True)
-
-    # Recommendation products features:
-    suggested_products = []
-
-    # 1. First try to find products with similar names
-    if product.name:
-        # Split the product name into words for matching
-        name_words = product.name.lower().split()
-        
-        # Create a Q object for name matching
-        name_q = Q()
-        
-        # Add each word from the name to our query
-        for word in name_words:
-            if len(word) > 3:  # Only match on words with more than 3 characters to avoid common words
-                name_q |= Q(name__icontains=word)
-        
-        # Find products with similar names
-        name_matches = all_products.filter(name_q)[:3]
-        suggested_products.extend(name_matches)
-    
-    # Keep track of already suggested product IDs to avoid duplicates
-    suggested_ids = [p.id for p in suggested_products]
-
-    # 2. If we need more products, look for products in the same category
-    if len(suggested_products) < 4:
-        category_matches = all_products.filter(category=product.category).exclude(
-            id__in=suggested_ids
-        )[:4-len(suggested_products)]
-        suggested_products.extend(category_matches)
-        # Update our list of suggested IDs
-        suggested_ids = [p.id for p in suggested_products]
-        
-    # 3. If we still need more, look for products with similar Pokemon
-    if len(suggested_products) < 4 and product.pokemon:
-        # Find products with the same Pokemon type
-        pokemon_matches = all_products.filter(
-            pokemon__icontains=product.pokemon
-        ).exclude(
-            id__in=suggested_ids
-        )[:4-len(suggested_products)]
-        
-        suggested_products.extend(pokemon_matches)
-        # Update our list of suggested IDs
-        suggested_ids = [p.id for p in suggested_products]
-
-    # If we still don't have 4 products, fill with random products
-    if len(suggested_products) < 4:
-        remaining_products = all_products.exclude(
-            id__in=suggested_ids
-        )
-        
-        # If we have remaining products, randomly select what we need
-        if remaining_products.exists():
-            # Convert queryset to list for random sampling
-            remaining_list = list(remaining_products)
-            # Calculate how many more products we need
-            needed = 4 - len(suggested_products)
-            # Randomly sample the needed number of products
-            random_picks = random.sample(remaining_list, min(needed, len(remaining_list)))
-            suggested_products.extend(random_picks)
-    
-    #  At most 4 suggested products
-    suggested_products = suggested_products[:4]
-
-    # Split features into a list
-    product_features = product.get_features_list()
-
-    # Get Pokemon data (server-side API call)
-    pokemon_data = None
-    if product.pokemon:
-        try:
-            pokemon_response = requests.get(f"https://pokeapi.co/api/v2/pokemon/{product.pokemon.lower()}")
-            if pokemon_response.status_code == 200:
-                pokemon_json = pokemon_response.json()
-                pokemon_data = {
-                    'name': pokemon_json.get('name', '').capitalize(),
-                    'sprite': pokemon_json.get('sprites', {}).get('front_default', ''),
-                    'types': [t.get('type', {}).get('name', '').capitalize() for t in pokemon_json.get('types', [])],
-                }
-        except Exception as e:
-            logger.error(f"Error fetching Pokemon data: {str(e)}")
+    reviews, reviews_next_cursor = get_review_page(product)
 
     user_context = {}
     if request.user.is_authenticated:
@@ -282,13 +202,43 @@ def product_detail(request, product_id=None):
     return render(request, 'store.html', {
         'product': product,
         'visuals': visuals,
-        'suggested_products': suggested_products,
+        # Passed as a callable, so the template only runs the queries on a fragment cache miss
+        'suggested_products': lambda: _get_suggested_products(product),
         'product_features': product_features,
-        'pokemon_data': pokemon_data,
+        # Stock not held by anyone's cart, not cached because holds come and go
+        'available_quantity': get_available_quantity(product),
         'reviews': reviews,
+        'reviews_next_cursor': reviews_next_cursor,
+        'rating_histogram': get_rating_histogram(product),
         'user_context': user_context,
+        'fragment_version': fragment_version,
     })
 
+def _get_suggested_products(product):
+    """Pick up to 4 products to show under "You May Also Like" """
+    product_id = product.id
+
+    # Precomputed related products (see related.py), one indexed lookup
+    suggested_products = get_related_products(product_id, limit=4)
+    suggested_ids = [p.id for p in suggested_products]
+
+    # If we still don't have 4 products, fill with random products
+    # (new products only get related products on the next batch run)
+    if len(suggested_products) < 4:
+        # Sample by id range instead of loading the whole catalog
+        needed = 4 - len(suggested_products)
+        random_picks = listed_product_sampler.sample(
+            needed,
+            exclude=[product_id] + suggested_ids,
+            queryset=Product.objects.select_related('category', 'user')
+        )
+        suggested_products.extend(random_picks)
+    
+    #  At most 4 suggested products
+    suggested_products = suggested_products[:4]
+
+    return suggested_products
+
 
 def search(request):
     query = request.GET.get('query', '').strip()
@@ -332,6 +282,10 @@ def search(request):
     if query and not results.exists():
         suggestions = Product.suggest_similar(query)
 
+    # Facet counts for the filter sidebar (one cached aggregate query)
+    from .facets import get_search_facets
+    facets = get_search_facets(query, category, min_price, max_price, min_rating)
+
     # Pagination - 8 products per page
     paginator = Paginator(results, 8)
 
@@ -346,6 +300,7 @@ def search(request):
         'results': results_page,
         'query': query,
         'suggestions': suggestions,
+        'facets': facets,
         'categories': Category.objects.all(),
         'category': category,
         'min_price': min_price,
@@ -381,10 +336,15 @@ def add_product_api(request):
                 category=category,
                 pokemon=data.get('pokemon', ''),
                 location=data.get('location', ''),
+                keywords=data.get('keywords', ''),
                 quantity=int(data.get('quantity', 0)),
                 user=request.user if request.user.is_authenticated else None
             )
             
+            # Link the normalized keywords (only admins get past AdminKeywordsMiddleware with keywords)
+            if product.keywords:
+                sync_product_keywords(product)
+            
             # Add visual content
             image_name = data.get('imageName', '').split('.')
             
@@ -425,7 +385,7 @@ def update_product_api(request, product_id):
                 product.category = category
             
             # Update other fields if provided
-            for field in ['name', 'description', 'feature', 'pokemon', 'location']:
+            for field in ['name', 'description', 'feature', 'pokemon', 'location', 'keywords']:
                 if field in data:
                     setattr(product, field, data[field])
             
@@ -447,6 +407,9 @@ def update_product_api(request, product_id):
             # Equivalent SQL Query:
             # UPDATE store_product SET name=%s, description=%s, ... WHERE id=%s
             product.save()
+            
+            if 'keywords' in data:
+                sync_product_keywords(product)
 
             # Invalidate product cache
             cache.delete(f'product_detail_{product_id}')
@@ -555,27 +518,26 @@ def add_review_api(request):
                     'error': f'{field.capitalize()} is required'
                 }, status=400)
         
-        # Create new review
-        review = Review.objects.create(
-            product=product,
-            user=request.user,  # Use the authenticated user
-            username=request.user.username,  # Set username from user object
-            rating=int(data.get('rating')),
-            comment=data.get('comment')
-        )
-        
-        # Update product rating
-        avg_rating = Review.objects.filter(product=product).aggregate(models.Avg('rating'))['rating__avg']
-        if avg_rating:
-            product.rating = avg_rating
-            product.save()
+        # Create new review and count it in the product's rating in the same transaction
+        with transaction.atomic():
+            review = Review.objects.create(
+                product=product,
+                user=request.user,  # Use the authenticated user
+                username=request.user.username,  # Set username from user object
+                rating=int(data.get('rating')),
+                comment=data.get('comment')
+            )
+            review_added(review)
         
         logger.info(f"Review added by {request.user.username} for product {product.id}")
         
+        # The rating was changed by an UPDATE, read it back before serializing the review
+        review.product.refresh_from_db(fields=['rating', 'review_count'])
+        
         return JsonResponse({
             'success': True, 
             'review': review.to_json(),
-            'product_avg_rating': product.rating
+            'product_avg_rating': review.product.rating
         })
     
     except Exception as e:
@@ -607,30 +569,35 @@ def update_review_api(request, review_id):
             }, status=403)
         
         data = json.loads(request.body)
-        
-        # Update review fields
-        if 'rating' in data:
-            review.rating = int(data.get('rating'))
-        
-        if 'comment' in data:
-            review.comment = data.get('comment')
-        
-        # Save the updated review
-        review.save()
-        
-        # Update product rating
-        product = review.product
-        avg_rating = Review.objects.filter(product=product).aggregate(models.Avg('rating'))['rating__avg']
-        if avg_rating:
-            product.rating = avg_rating
-            product.save()
+        rating = int(data.get('rating')) if 'rating' in data else None
+        
+        # Save the updated review and move its stars in the product's rating
+        with transaction.atomic():
+            # Lock and re-read the review, so a concurrent edit can't change the rating the delta starts from
+            review = Review.objects.select_for_update().filter(id=review.id).first()
+            if review is None:
+                return JsonResponse({'success': False, 'error': 'Review not found'}, status=404)
+            old_rating = review.rating
+            
+            # Update review fields
+            if rating is not None:
+                review.rating = rating
+            
+            if 'comment' in data:
+                review.comment = data.get('comment')
+            
+            review.save()
+            review_rating_changed(review, old_rating)
         
         logger.info(f"Review {review_id} updated by {request.user.username}")
         
+        # The rating was changed by an UPDATE, read it back before serializing the review
+        review.product.refresh_from_db(fields=['rating', 'review_count'])
+        
         return JsonResponse({
             'success': True, 
             'review': review.to_json(),
-            'product_avg_rating': product.rating
+            'product_avg_rating': review.product.rating
         })
     
     except Exception as e:
@@ -661,20 +628,9 @@ def delete_review_api(request, review_id):
                 'error': 'You do not have permission to delete this review'
             }, status=403)
         
-        # Get product before deleting review for rating update
-        product = review.product
-        
-        # Delete the review
-        review.delete()
-        
-        # Update product rating
-        avg_rating = Review.objects.filter(product=product).aggregate(models.Avg('rating'))['rating__avg']
-        if avg_rating:
-            product.rating = avg_rating
-        else:
-            # If no reviews left, set rating to 0
-            product.rating = 0
-        product.save()
+        # Delete the review and take it out of the product's rating
+        if not delete_review(review):
+            return JsonResponse({'success': False, 'error': 'Review not found'}, status=404)
         
         logger.info(f"Review {review_id} deleted by {request.user.username}")
         
@@ -684,59 +640,57 @@ def delete_review_api(request, review_id):
         logger.error(f"Error deleting review: {str(e)}")
         return JsonResponse({'success': False, 'error': str(e)}, status=400)
     
-def _get_cart(session_id):
+def _get_cart(request):
     """
-    Get or create a cart for the given session ID
+    Get or create the database cart of a logged in user
+    (anonymous visitors use a SessionCart from cart_store.py instead)
     
     # ORM Query:
-    cart, created = Cart.objects.get_or_create(session_id=session_id)
+    cart = Cart.get_or_create_cart(user=request.user, session_id=request.session.session_key)
     
     # Equivalent SQL:
-    # SELECT * FROM store_cart WHERE session_id = %s LIMIT 1;
+    # SELECT * FROM store_cart WHERE user_id = %s AND is_active LIMIT 1;
     # If not found:
-    # INSERT INTO store_cart (session_id, created_at, updated_at) VALUES (%s, NOW(), NOW());
+    # INSERT INTO store_cart (user_id, session_id, is_active, created_at, updated_at) VALUES (%s, %s, TRUE, NOW(), NOW());
     """
-    cart, created = Cart.objects.get_or_create(session_id=session_id)
-    if created:
-        logger.info(f"Created new cart for session {session_id}")
-    return cart
+    return Cart.get_or_create_cart(user=request.user, session_id=request.session.session_key)
+
+def _hold_cart_units(cart, product_id, change=0):
+    """
+    Hold the cart's units of a product plus change when cart holds are on (see holds.py)
+    Returns an error response if that many units can't be held
+    """
+    if not holds_enabled():
+        return None
+    try:
+        set_hold(cart.holder, product_id, cart.product_units(product_id) + change)
+    except InsufficientStock as e:
+        return JsonResponse({
+            'success': False, 
+            'error': f"Only {e.items[0]['available']} items available in stock"
+        }, status=400)
+    return None
 
 @csrf_exempt
 def get_cart(request):
-    """Get the current cart items for a session"""
-    session_id = request.session.session_key
-    if not session_id:
-        request.session.create()
-        session_id = request.session.session_key
+    """Get the current cart items for a user or session"""
+    if not request.user.is_authenticated:
+        # Read from the session, browsing without a cart writes nothing
+        cart = SessionCart(request)
+        return JsonResponse(apply_available_stock(cart.to_json(), cart.holder if cart.token else None))
     
-    cart = _get_cart(session_id)
+    cart = _get_cart(request)
     
-    # ORM Query: Get all cart items with product details
+    # ORM Query: Get all cart items with product details and primary image
     # Equivalent SQL Query:
-    # SELECT ci.*, p.name, p.price 
+    # SELECT ci.id, ci.quantity, ci.size, p.id, p.name, p.price, p.quantity,
+    #        COALESCE((SELECT v.short_name || '.' || v.file_type FROM store_visualcontent v
+    #                  WHERE v.product_id = ci.product_id ORDER BY v.id LIMIT 1), 'default.jpg') AS image
     # FROM store_cartitem ci
     # JOIN store_product p ON ci.product_id = p.id
-    # WHERE ci.cart_id = %s;
-    cart_items = []
-    for item in cart.items.all():
-        product = item.product
-        cart_items.append({
-            'id': item.id,
-            'product_id': product.id,
-            'name': product.name,
-            'price': float(product.price),
-            'quantity': item.quantity,
-            'size': item.size,
-            'subtotal': float(item.subtotal),
-            'image': product.get_primary_image_name(),
-            'stock_quantity': product.quantity
-        })
-    
-    return JsonResponse({
-        'cart_id': cart.id,
-        'total': float(cart.total_price),
-        'items': cart_items
-    })
+    # WHERE ci.cart_id = %s ORDER BY ci.id;
+    # stock_quantity is lowered by what other carts hold when cart holds are on
+    return JsonResponse(apply_available_stock(cart.to_json(), cart.holder))
 
 @csrf_exempt
 def add_to_cart(request):
@@ -767,13 +721,28 @@ def add_to_cart(request):
                 'error': f'Only {product.quantity} items available in stock'
             }, status=400)
         
-        # Get or create cart
-        session_id = request.session.session_key
-        if not session_id:
-            request.session.create()
-            session_id = request.session.session_key
+        if not request.user.is_authenticated:
+            # Anonymous carts stay in the session until checkout or login
+            cart = SessionCart(request)
+            existing_item = cart.find(product.id, size)
+            if existing_item and existing_item['quantity'] + quantity > product.quantity:
+                return JsonResponse({
+                    'success': False, 
+                    'error': f"Cannot add {quantity} more items. Only {product.quantity - existing_item['quantity']} more available"
+                }, status=400)
+            
+            error = _hold_cart_units(cart, product.id, quantity)
+            if error:
+                return error
+            
+            item = cart.add(product.id, quantity, size)
+            return JsonResponse({
+                'success': True,
+                'item_id': item['id'],
+                'cart_total': float(cart.total_price)
+            })
         
-        cart = _get_cart(session_id)
+        cart = _get_cart(request)
         
         # ORM Query: Get cart item if exists in cart
         # Equivalent SQL Query:
@@ -791,26 +760,33 @@ def add_to_cart(request):
                     'success': False, 
                     'error': f'Cannot add {quantity} more items. Only {product.quantity - existing_item.quantity} more available'
                 }, status=400)
+        
+        # The hold and the cart line are written together, a failed write leaves no hold behind
+        with transaction.atomic():
+            error = _hold_cart_units(cart, product.id, quantity)
+            if error:
+                return error
             
-            # ORM Query: Update cart item quantity
-            # Equivalent SQL Query:
-            # UPDATE store_cartitem SET quantity = quantity + %s WHERE id = %s;
-            existing_item.quantity += quantity
-            existing_item.save()
-            logger.info(f"Updated cart item quantity: {existing_item.id}")
-            item = existing_item
-        else:
-            # ORM Query: Create new cart item
-            # Equivalent SQL Query:
-            # INSERT INTO store_cartitem (cart_id, product_id, quantity, size, created_at) 
-            # VALUES (%s, %s, %s, %s, NOW());
-            item = CartItem.objects.create(
-                cart=cart,
-                product=product,
-                quantity=quantity,
-                size=size
-            )
-            logger.info(f"Added new item to cart: {item.id}")
+            if existing_item:
+                # ORM Query: Update cart item quantity
+                # Equivalent SQL Query:
+                # UPDATE store_cartitem SET quantity = quantity + %s WHERE id = %s;
+                existing_item.quantity += quantity
+                existing_item.save()
+                logger.info(f"Updated cart item quantity: {existing_item.id}")
+                item = existing_item
+            else:
+                # ORM Query: Create new cart item
+                # Equivalent SQL Query:
+                # INSERT INTO store_cartitem (cart_id, product_id, quantity, size, created_at) 
+                # VALUES (%s, %s, %s, %s, NOW());
+                item = CartItem.objects.create(
+                    cart=cart,
+                    product=product,
+                    quantity=quantity,
+                    size=size
+                )
+                logger.info(f"Added new item to cart: {item.id}")
         
         return JsonResponse({
             'success': True,
@@ -832,38 +808,66 @@ def update_cart_item(request, item_id):
         data = json.loads(request.body)
         quantity = int(data.get('quantity', 1))
         
+        if not request.user.is_authenticated:
+            cart = SessionCart(request)
+            item = cart.get(item_id)
+            if item is None:
+                return JsonResponse({'success': False, 'error': 'Cart item not found'}, status=404)
+            
+            product = get_object_or_404(Product, id=item['product_id'])
+            if quantity > product.quantity:
+                return JsonResponse({
+                    'success': False, 
+                    'error': f'Only {product.quantity} items available in stock'
+                }, status=400)
+            
+            error = _hold_cart_units(cart, product.id, max(quantity, 0) - item['quantity'])
+            if error:
+                return error
+            
+            cart.update(item_id, quantity)
+            return JsonResponse({
+                'success': True,
+                'cart_total': float(cart.total_price)
+            })
+        
         # ORM Query: Get cart item
         # Equivalent SQL Query:
         # SELECT * FROM store_cartitem WHERE id = %s;
         item = get_object_or_404(CartItem, id=item_id)
         product = item.product
         
-        # Verify session owns this cart item
-        session_id = request.session.session_key
-        if item.cart.session_id != session_id:
+        # Verify the user owns this cart item
+        if item.cart.user_id != request.user.id:
             return JsonResponse({'success': False, 'error': 'Unauthorized'}, status=403)
         
-        if quantity <= 0:
-            # Delete item if quantity is 0 or less
-            # ORM Query: Delete cart item
-            # Equivalent SQL Query:
-            # DELETE FROM store_cartitem WHERE id = %s;
-            item.delete()
-            logger.info(f"Deleted cart item: {item_id}")
-        else:
-            # Check if requested quantity is available in stock
-            if quantity > product.quantity:
-                return JsonResponse({
-                    'success': False, 
-                    'error': f'Only {product.quantity} items available in stock'
-                }, status=400)
+        # Check if requested quantity is available in stock
+        if quantity > 0 and quantity > product.quantity:
+            return JsonResponse({
+                'success': False, 
+                'error': f'Only {product.quantity} items available in stock'
+            }, status=400)
+        
+        # The hold and the cart line are written together, a failed write leaves no hold behind
+        with transaction.atomic():
+            error = _hold_cart_units(item.cart, product.id, max(quantity, 0) - item.quantity)
+            if error:
+                return error
             
-            # ORM Query: Update cart item quantity
-            # Equivalent SQL Query:
-            # UPDATE store_cartitem SET quantity = %s WHERE id = %s;
-            item.quantity = quantity
-            item.save()
-            logger.info(f"Updated cart item quantity: {item_id}")
+            if quantity <= 0:
+                # Delete item if quantity is 0 or less
+                # ORM Query: Delete cart item
+                # Equivalent SQL Query:
+                # DELETE FROM store_cartitem WHERE id = %s;
+                item.delete()
+                logger.info(f"Deleted cart item: {item_id}")
+            else:
+                # ORM Query: Update cart item quantity
+                # Equivalent SQL Query:
+                # UPDATE store_cartitem SET quantity = %s WHERE id = %s;
+                item.quantity = quantity
+                item.save()
+                logger.info(f"Updated cart item quantity: {item_id}")
         
         cart = item.cart
         return JsonResponse({
@@ -882,14 +886,27 @@ def remove_from_cart(request, item_id):
         return JsonResponse({'success': False, 'error': 'Method not allowed'}, status=405)
     
     try:
+        if not request.user.is_authenticated:
+            cart = SessionCart(request)
+            if cart.get(item_id) is None:
+                return JsonResponse({'success': False, 'error': 'Cart item not found'}, status=404)
+            
+            product_id = cart.get(item_id)['product_id']
+            cart.remove(item_id)
+            _hold_cart_units(cart, product_id)
+            logger.info(f"Removed item from session cart: {item_id}")
+            return JsonResponse({
+                'success': True,
+                'cart_total': float(cart.total_price)
+            })
+        
         # ORM Query: Get cart item
         # Equivalent SQL Query:
         # SELECT * FROM store_cartitem WHERE id = %s;
         item = get_object_or_404(CartItem, id=item_id)
         
-        # Verify session owns this cart item
-        session_id = request.session.session_key
-        if item.cart.session_id != session_id:
+        # Verify the user owns this cart item
+        if item.cart.user_id != request.user.id:
             return JsonResponse({'success': False, 'error': 'Unauthorized'}, status=403)
         
         cart = item.cart
@@ -897,7 +914,9 @@ def remove_from_cart(request, item_id):
         # ORM Query: Delete cart item
         # Equivalent SQL Query:
         # DELETE FROM store_cartitem WHERE id = %s;
-        item.delete()
+        with transaction.atomic():
+            item.delete()
+            _hold_cart_units(cart, item.product_id)
         logger.info(f"Removed item from cart: {item_id}")
         
         return JsonResponse({
@@ -911,7 +930,11 @@ def remove_from_cart(request, item_id):
 
 @csrf_exempt
 def checkout(request):
-    """Process checkout and create an order"""
+    """
+    Process checkout and create an order
+    Runs in a fixed number of queries whatever the cart size: one read of the cart lines,
+    one locked read and one UPDATE of the products, bulk inserts for the order items
+    """
     if request.method != 'POST':
         return JsonResponse({'success': False, 'error': 'Method not allowed'}, status=405)
     
@@ -919,81 +942,102 @@ def checkout(request):
         data = json.loads(request.body)
         session_id = request.session.session_key
         
-        # Get the cart
-        cart = _get_cart(session_id)
-        
-        # Verify cart has items
-        if not cart.items.exists():
-            return JsonResponse({'success': False, 'error': 'Cart is empty'}, status=400)
-        
-        # Check stock levels before proceeding
-        insufficient_stock = []
-        for cart_item in cart.items.all():
-            product = cart_item.product
-            if cart_item.quantity > product.quantity:
-                insufficient_stock.append({
-                    'product_name': product.name,
-                    'requested': cart_item.quantity,
-                    'available': product.quantity
-                })
+        # Get the cart, an anonymous cart is only written to the database below
+        session_cart = None
+        if request.user.is_authenticated:
+            cart = _get_cart(request)
+        else:
+            session_cart = SessionCart(request)
+            if not session_cart.items:
+                return JsonResponse({'success': False, 'error': 'Cart is empty'}, status=400)
         
-        if insufficient_stock:
+        try:
+            # Take the stock and write the order in one transaction, a failure leaves both untouched
+            with transaction.atomic():
+                if session_cart:
+                    # A temporary cart for this checkout only, rolled back with everything else on failure
+                    cart = session_cart.persist()
+                
+                # ORM Query: Get the cart lines (their products are read under lock below)
+                # Equivalent SQL Query:
+                # SELECT * FROM store_cartitem WHERE cart_id = %s ORDER BY id;
+                cart_items = list(cart.items.order_by('id'))
+                
+                # Verify cart has items
+                if not cart_items:
+                    if session_cart:
+                        cart.delete()
+                    return JsonResponse({'success': False, 'error': 'Cart is empty'}, status=400)
+                
+                # Lock the products in id order and decrement their stock (see inventory.py)
+                # Equivalent SQL Query:
+                # SELECT * FROM store_product WHERE id IN (...) ORDER BY id FOR UPDATE;
+                # UPDATE store_product SET quantity = quantity - %s WHERE id = %s AND quantity >= %s;
+                # (units this cart holds are its own, other carts' holds are not available)
+                holder = session_cart.holder if session_cart else cart.holder
+                products = reserve_stock([(item.product_id, item.quantity) for item in cart_items], holder)
+                
+                # Prices are read from the locked rows
+                total_amount = sum(products[item.product_id].price * item.quantity for item in cart_items)
+                
+                # Create order
+                # ORM Query: Create order
+                # Equivalent SQL Query:
+                # INSERT INTO store_order (session_id, full_name, email, shipping_address, total_amount, status, ..., created_at, updated_at) 
+                # VALUES (%s, %s, %s, %s, %s, ... 'pending', NOW(), NOW());
+                order = Order.objects.create(
+                    user=request.user if request.user.is_authenticated else None,
+                    session_id=session_id,
+                    full_name=data.get('full_name'),
+                    email=data.get('email'),
+                    shipping_address=data.get('shipping_address'),
+                    total_amount=total_amount,
+                    payment_method=data.get('payment_method'),
+                    status='pending'
+                )
+                
+                # Create all order items at once
+                # ORM Query: Bulk create order items
+                # Equivalent SQL Query:
+                # INSERT INTO store_orderitem (order_id, product_name, product_id, price, quantity, size) 
+                # VALUES (%s, %s, %s, %s, %s, %s), (...), ...;
+                OrderItem.objects.bulk_create([
+                    OrderItem(
+                        order=order,
+                        product_name=products[item.product_id].name,
+                        product_id=item.product_id,
+                        price=products[item.product_id].price,
+                        quantity=item.quantity,
+                        size=item.size
+                    )
+                    for item in cart_items
+                ])
+                ordered = [(item.product_id, item.quantity) for item in cart_items]
+                
+                # Bump the popularity counters behind the "popular" listing
+                record_order(ordered)
+                
+                # Keep the user's purchased products (review eligibility) current
+                if order.user_id:
+                    add_purchased_products(order.user_id, [product_id for product_id, _ in ordered])
+                
+                # Clear the cart (a visitor's temporary cart goes entirely)
+                # ORM Query: Delete all cart items
+                # Equivalent SQL Query:
+                # DELETE FROM store_cartitem WHERE cart_id = %s;
+                if session_cart:
+                    cart.delete()
+                else:
+                    cart.items.all().delete()
+        except InsufficientStock as e:
             return JsonResponse({
                 'success': False, 
-                'error': 'Some items have insufficient stock',
-                'items': insufficient_stock
+                'error': str(e),
+                'items': e.items
             }, status=400)
         
-        # Create order
-        # ORM Query: Create order
-        # Equivalent SQL Query:
-        # INSERT INTO store_order (session_id, full_name, email, shipping_address, total_amount, status, ..., created_at, updated_at) 
-        # VALUES (%s, %s, %s, %s, %s, ... 'pending', NOW(), NOW());
-        order = Order.objects.create(
-            user=request.user,
-            session_id=session_id,
-            full_name=data.get('full_name'),
-            email=data.get('email'),
-            shipping_address=data.get('shipping_address'),
-            total_amount=cart.total_price,
-            payment_method=data.get('payment_method'),
-            status='pending'
-        )
-        
-        # Create order items for each cart item
-        # ORM Query: Get all cart items
-        # Equivalent SQL Query:
-        # SELECT * FROM store_cartitem WHERE cart_id = %s;
-        for cart_item in cart.items.all():
-            # ORM Query: Create order item
-            # Equivalent SQL Query:
-            # INSERT INTO store_orderitem (order_id, product_name, product_id, price, quantity, size) 
-            # VALUES (%s, %s, %s, %s, %s, %s);
-            OrderItem.objects.create(
-                order=order,
-                product_name=cart_item.product.name,
-                product=cart_item.product,
-                price=cart_item.product.price,
-                quantity=cart_item.quantity,
-                size=cart_item.size
-            )
-
-            # Update product quantity
-            # ORM Query: Decrease product quantity
-            # Equivalent SQL Query:
-            # UPDATE store_product SET quantity = quantity - %s WHERE id = %s;
-            product.quantity = F('quantity') - cart_item.quantity
-            product.save()
-            
-            # Refresh from database to get the actual value after F() operation
-            product.refresh_from_db()
-            logger.info(f"Updated product {product.id} quantity to {product.quantity}")
-        
-        # Clear the cart
-        # ORM Query: Delete all cart items
-        # Equivalent SQL Query:
-        # DELETE FROM store_cartitem WHERE cart_id = %s;
-        cart.items.all().delete()
+        if session_cart:
+            session_cart.clear()
         logger.info(f"Created order {order.id} and cleared cart")
         
         return JsonResponse({
@@ -67,6 +67,9 @@ MIDDLEWARE = [
 ]
 
 # Cache Configuration
+# LocMemCache is per process: with more than one worker process, use a shared backend
+# (Redis, Memcached or the database cache) so product changes reach every process's
+# search index (store/search.py) and cached results, purchases and fragments.
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
@@ -74,6 +77,34 @@ CACHES = {
     }
 }
 
+# Product search
+# Use 'store.search.DatabaseSearchBackend' to fall back to unranked substring matching
+SEARCH_BACKEND = 'store.search.InvertedIndexBackend'
+SEARCH_MAX_RESULTS = 500  # Most ranked hits handed back to the database per query
+SEARCH_RESULTS_CACHE_TIMEOUT = 600  # Cached result id lists live 10 minutes (or until a product changes)
+
+# External enrichment APIs, see store/enrichment.py for the per-source options (TTLs, circuit breaker)
+# Point the base URLs at a local stub server to run without the real APIs
+ENRICHMENT_SOURCES = {
+    'pokemon': {'base_url': os.environ.get('POKEAPI_BASE_URL', 'https://pokeapi.co/api/v2')},
+    'weather': {'base_url': os.environ.get('OPENWEATHER_BASE_URL', 'https://api.openweathermap.org/data/2.5')},
+}
+ENRICHMENT_DEADLINE = 5  # Seconds api_product_detail waits for all enrichment sources together
+
+# Pooled outbound HTTP clients (store/outbound.py), 'default' applies to every host
+OUTBOUND_HTTP = {
+    'default': {'timeout': 5, 'pool_maxsize': 10, 'retries': 2, 'backoff_factor': 0.3},
+    'api.openai.com': {'timeout': 60},
+    # Enrichment sources (store/enrichment.py) don't retry, a read timeout would otherwise cost
+    # 3x the timeout; their circuit breaker and stale-while-revalidate cache cover failures
+    'pokeapi.co': {'retries': 0},
+    'api.openweathermap.org': {'retries': 0},
+}
+
+# Cart lines hold their stock for a while (store/holds.py), run release_expired_holds on a schedule
+CART_HOLDS_ENABLED = True
+CART_HOLD_TTL = 15 * 60  # Seconds a cart's holds last after its last change
+
 ROOT_URLCONF = 'wildcatwear.urls'
 
 NOTIFICATION_SETTINGS = {